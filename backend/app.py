@@ -1,14 +1,26 @@
 import sys
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from gunicorn.app.wsgiapp import run
 from src.users.router import auth_router, user_router
+from src.experiments import executor, jobs
 from src.experiments.router import experiments_router
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    executor.lag_monitor.start()
+    yield
+    executor.shutdown()
+    jobs.shutdown()
+
+
 app = FastAPI(
     title="AnsamblesServer",
     version="1.0.0",
     description="Backend API for ML Ensembles training and prediction",
+    lifespan=lifespan,
 )
 
 app.include_router(user_router)
@@ -4,15 +4,29 @@ This app only includes experiments endpoints for training and inference.
 No database or authentication required.
 """
 import sys
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from src.experiments import executor, jobs
 from src.experiments.router import experiments_router
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the event loop lag monitor and stop worker pools on shutdown."""
+    executor.lag_monitor.start()
+    yield
+    executor.shutdown()
+    jobs.shutdown()
+
+
 app = FastAPI(
     title="ML Ensembles Server",
     version="1.0.0",
     description="Backend API for ML Ensembles training and prediction",
+    lifespan=lifespan,
 )
 
 app.include_router(experiments_router)
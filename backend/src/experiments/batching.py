@@ -0,0 +1,141 @@
+import asyncio
+import os
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from src.experiments import service
+from src.experiments.executor import run_blocking
+
+
+PREDICT_BATCH_WINDOW_MS = float(os.environ.get("PREDICT_BATCH_WINDOW_MS", 0))
+PREDICT_MAX_BATCH_ROWS = int(os.environ.get("PREDICT_MAX_BATCH_ROWS", 4096))
+
+
+@dataclass
+class _PendingBatch:
+    parts: list[np.ndarray] = field(default_factory=list)
+    futures: list[asyncio.Future] = field(default_factory=list)
+    rows: int = 0
+    timer: asyncio.TimerHandle | None = None
+
+
+class PredictionBatcher:
+    """Coalesce concurrent small prediction requests per experiment.
+
+    Rows of requests arriving within `window` seconds are stacked into one
+    matrix, predicted with a single `model.predict` call and scattered back.
+    A batch is flushed early once it reaches `max_rows` rows. A zero window
+    disables coalescing.
+    """
+
+    def __init__(self, window: float, max_rows: int) -> None:
+        """Initialize the batcher with its waiting window and batch size limit."""
+        self.window = window
+        self.max_rows = max_rows
+        self._pending: dict[tuple[str, int | None], _PendingBatch] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self.batches = 0
+        self.requests = 0
+        self.rows = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Whether requests are coalesced at all."""
+        return self.window > 0
+
+    async def predict(
+        self,
+        experiment_name: str,
+        X: np.ndarray,
+        n_trees: int | None = None,
+    ) -> np.ndarray:
+        """Predict for `X`, possibly together with other waiting requests.
+
+        Only requests for the same number of trees share a batch.
+        """
+        if not self.enabled or len(X) >= self.max_rows:
+            return await run_blocking(
+                service.predict_features, experiment_name, X, n_trees
+            )
+
+        loop = asyncio.get_running_loop()
+        key = (experiment_name, n_trees)
+        batch = self._pending.setdefault(key, _PendingBatch())
+        if batch.parts and batch.parts[0].shape[1] != X.shape[1]:
+            # Строки другой ширины не склеить с ожидающими: считаем отдельно
+            return await run_blocking(
+                service.predict_features, experiment_name, X, n_trees
+            )
+
+        future = loop.create_future()
+        batch.parts.append(X)
+        batch.futures.append(future)
+        batch.rows += len(X)
+
+        if batch.rows >= self.max_rows:
+            self._schedule_flush(key)
+        elif batch.timer is None:
+            batch.timer = loop.call_later(
+                self.window,
+                self._schedule_flush,
+                key,
+            )
+        return await future
+
+    def stats(self) -> dict[str, float | int]:
+        """Get batch counters and the mean number of requests per batch."""
+        return {
+            "enabled": self.enabled,
+            "batches": self.batches,
+            "requests": self.requests,
+            "rows": self.rows,
+            "mean_requests_per_batch": self.requests / self.batches if self.batches else 0.0,
+        }
+
+    def _schedule_flush(self, key: tuple[str, int | None]) -> None:
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        task = asyncio.get_running_loop().create_task(
+            self._flush(key, batch)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(
+        self,
+        key: tuple[str, int | None],
+        batch: _PendingBatch,
+    ) -> None:
+        experiment_name, n_trees = key
+        self.batches += 1
+        self.requests += len(batch.futures)
+        self.rows += batch.rows
+        try:
+            predictions = await run_blocking(
+                service.predict_features,
+                experiment_name,
+                np.concatenate(batch.parts),
+                n_trees,
+            )
+        except Exception as e:
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        # Раздаём ожидающим запросам их части общего предсказания
+        start = 0
+        for part, future in zip(batch.parts, batch.futures):
+            if not future.done():
+                future.set_result(predictions[start:start + len(part)])
+            start += len(part)
+
+
+prediction_batcher = PredictionBatcher(
+    window=PREDICT_BATCH_WINDOW_MS / 1e3,
+    max_rows=PREDICT_MAX_BATCH_ROWS,
+)
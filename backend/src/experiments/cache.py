@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable
+
+
+@dataclass
+class _CacheEntry:
+    version: Hashable
+    value: Any
+    nbytes: int
+
+
+class ModelCache:
+    """In-process LRU cache of loaded models bounded by total model bytes."""
+
+    def __init__(self, max_bytes: int) -> None:
+        """Initialize an empty cache holding at most `max_bytes` of models."""
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, _CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(
+        self,
+        key: str,
+        version: Hashable,
+        loader: Callable[[], tuple[Any, int]],
+    ) -> Any:
+        """Return the cached value for `key` at `version`, loading it on a miss.
+
+        `loader` returns the value together with its size in bytes.
+        A cached entry with a different version is treated as stale.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            self.misses += 1
+
+        # Загрузка идёт без блокировки, чтобы не задерживать другие модели
+        value, nbytes = loader()
+
+        with self._lock:
+            self._remove(key)
+            if nbytes <= self.max_bytes:
+                self._entries[key] = _CacheEntry(version, value, nbytes)
+                self._bytes += nbytes
+                while self._bytes > self.max_bytes:
+                    oldest = next(iter(self._entries))
+                    self._remove(oldest)
+                    self.evictions += 1
+        return value
+
+    def stats(self) -> dict[str, int]:
+        """Get hit, miss and eviction counters and current occupancy."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
@@ -0,0 +1,88 @@
+import asyncio
+import functools
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+
+T = TypeVar("T")
+
+SERVICE_THREADS = int(
+    os.environ.get("SERVICE_THREADS", min(32, (os.cpu_count() or 1) + 4))
+)
+LAG_CHECK_INTERVAL = float(os.environ.get("LAG_CHECK_INTERVAL", 0.5))
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Get the thread pool for blocking service calls, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=SERVICE_THREADS,
+            thread_name_prefix="service",
+        )
+    return _executor
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking service call in the service thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_executor(),
+        functools.partial(func, *args, **kwargs),
+    )
+
+
+class EventLoopLagMonitor:
+    """Measure how late the event loop wakes up from a periodic sleep."""
+
+    def __init__(self, interval: float, window: int = 120) -> None:
+        """Initialize the monitor keeping the last `window` lag samples."""
+        self.interval = interval
+        self._samples: deque[float] = deque(maxlen=window)
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        """Start sampling on the running event loop."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        """Stop sampling."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self._samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def stats(self) -> dict[str, float | int]:
+        """Get last, mean and max lag in milliseconds over the recent window."""
+        samples = list(self._samples)
+        if not samples:
+            return {"last_ms": 0.0, "mean_ms": 0.0, "max_ms": 0.0, "samples": 0}
+        return {
+            "last_ms": samples[-1] * 1e3,
+            "mean_ms": sum(samples) / len(samples) * 1e3,
+            "max_ms": max(samples) * 1e3,
+            "samples": len(samples),
+        }
+
+
+lag_monitor = EventLoopLagMonitor(interval=LAG_CHECK_INTERVAL)
+
+
+def shutdown() -> None:
+    """Stop the lag monitor and the service thread pool."""
+    global _executor
+    lag_monitor.stop()
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
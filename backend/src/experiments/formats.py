@@ -0,0 +1,91 @@
+import io
+import json
+
+import numpy as np
+
+
+JSON = "application/json"
+NPY = "application/x-npy"
+RAW = "application/octet-stream"
+ARROW = "application/vnd.apache.arrow.stream"
+
+RAW_DTYPES = {"float64": "<f8", "float32": "<f4"}
+
+
+class NotAcceptableError(ValueError):
+    """None of the media types in the Accept header can be produced."""
+
+
+def negotiate(accept: str | None) -> tuple[str, str]:
+    """Choose the predictions media type for an Accept header.
+
+    Returns the media type and, for raw binary output, the requested
+    dtype name. Types are tried in order of their quality values, and
+    JSON is used when the header is missing or accepts anything.
+    """
+    if not accept:
+        return JSON, ""
+
+    candidates = []
+    for position, item in enumerate(accept.split(",")):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        options = dict(
+            param.split("=", 1) for param in params if "=" in param
+        )
+        try:
+            quality = float(options.pop("q", 1.0))
+        except ValueError:
+            quality = 0.0
+        if quality > 0:
+            candidates.append((-quality, position, media_type.lower(), options))
+
+    for _, _, media_type, options in sorted(candidates):
+        if media_type in (JSON, "application/*", "*/*"):
+            return JSON, ""
+        if media_type == NPY:
+            return NPY, ""
+        if media_type == RAW:
+            dtype = options.get("dtype", "float64").strip('"').lower()
+            if dtype in RAW_DTYPES:
+                return RAW, dtype
+        if media_type == ARROW and _has_pyarrow():
+            return ARROW, ""
+
+    raise NotAcceptableError(
+        f"Supported media types: {JSON}, {NPY}, "
+        f"{RAW}; dtype=float32|float64, {ARROW}"
+    )
+
+
+def encode_predictions(
+    predictions: np.ndarray,
+    media_type: str,
+    dtype: str = "",
+) -> bytes:
+    """Serialize a predictions vector into the negotiated media type."""
+    if media_type == NPY:
+        buffer = io.BytesIO()
+        np.save(buffer, predictions.astype("<f8", copy=False))
+        return buffer.getvalue()
+
+    if media_type == RAW:
+        return predictions.astype(RAW_DTYPES[dtype], copy=False).tobytes()
+
+    if media_type == ARROW:
+        import pyarrow as pa
+
+        batch = pa.record_batch([pa.array(predictions)], names=["prediction"])
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, batch.schema) as writer:
+            writer.write_batch(batch)
+        return sink.getvalue().to_pybytes()
+
+    return json.dumps({"predictions": predictions.tolist()}).encode()
+
+
+def _has_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
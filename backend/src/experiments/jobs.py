@@ -0,0 +1,234 @@
+"""Background training jobs.
+
+Jobs run in a bounded process pool. Their state lives in small JSON files
+under the runs directory, so any worker process can report the status of a
+job submitted by another one. An experiment has at most one active job: a
+file lock shared by all workers guards its submission.
+"""
+import fcntl
+import json
+import os
+import re
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Literal
+
+from src.experiments import service
+
+
+JobStatus = Literal["queued", "running", "done", "failed"]
+
+TRAIN_WORKERS = int(os.environ.get("TRAIN_WORKERS", min(4, os.cpu_count() or 1)))
+TRAIN_LOCK_FILE = ".train.lock"
+ACTIVE_JOB_FILE = ".active_job"
+
+_executor: ProcessPoolExecutor | None = None
+
+
+class TrainingConflictError(RuntimeError):
+    """Another kind of training job is already active for the experiment."""
+
+
+def get_jobs_dir() -> Path:
+    """Get the directory with job state files."""
+    jobs_dir = service.get_runs_dir() / ".jobs"
+    jobs_dir.mkdir(parents=True, exist_ok=True)
+    return jobs_dir
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Get the process pool executing training jobs, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=TRAIN_WORKERS,
+            mp_context=get_context("spawn"),
+        )
+    return _executor
+
+
+def submit_to_pool(*args: Any) -> Future:
+    """Submit `run_training_job` with `args`, replacing a broken pool once.
+
+    A pool whose process was killed, e.g. by the OOM killer, rejects all
+    further submissions, so it is shut down and created anew.
+    """
+    try:
+        return get_executor().submit(run_training_job, *args)
+    except BrokenProcessPool:
+        shutdown()
+        return get_executor().submit(run_training_job, *args)
+
+
+def shutdown() -> None:
+    """Stop the process pool, cancelling jobs that have not started yet."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def read_job(job_id: str) -> dict[str, Any] | None:
+    """Read the state of a job, or None if there is no such job."""
+    if not re.fullmatch(r"[0-9a-f]{32}", job_id):
+        return None
+    job_path = get_jobs_dir() / f"{job_id}.json"
+    try:
+        with job_path.open("r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def update_job(job_id: str, **fields: Any) -> dict[str, Any]:
+    """Update fields of a job state and write it atomically."""
+    job = read_job(job_id) or {"job_id": job_id}
+    job.update(fields)
+
+    job_path = get_jobs_dir() / f"{job_id}.json"
+    tmp_path = job_path.with_suffix(f".{os.getpid()}.tmp")
+    with tmp_path.open("w") as f:
+        json.dump(job, f, indent=2)
+    os.replace(tmp_path, job_path)
+    return job
+
+
+def submit_training(
+    experiment_name: str,
+    extra_trees: int | None = None,
+) -> dict[str, Any]:
+    """Enqueue training of an experiment and return the job state.
+
+    With `extra_trees` the current model is grown by that many trees.
+    If the experiment is already being trained with the same `extra_trees`,
+    by this or another worker, the state of that job is returned instead of
+    starting a new one. Raises TrainingConflictError if the active job
+    differs, so the request is not silently dropped.
+    """
+    exp_dir = service.get_experiment_dir(experiment_name)
+    with (exp_dir / TRAIN_LOCK_FILE).open("a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            job = get_active_job(experiment_name)
+            if job is not None:
+                if job.get("extra_trees") != extra_trees:
+                    raise TrainingConflictError(
+                        f"Experiment '{experiment_name}' is already being "
+                        f"trained by job '{job['job_id']}'"
+                    )
+                return job
+
+            job_id = uuid.uuid4().hex
+            # Читатели прогресса не должны увидеть записи предыдущего запуска
+            service.reset_progress(experiment_name)
+            job = update_job(
+                job_id,
+                experiment_name=experiment_name,
+                status="queued",
+                progress=0.0,
+                error=None,
+                extra_trees=extra_trees,
+                pid=os.getpid(),
+                created_at=time.time(),
+                started_at=None,
+                finished_at=None,
+            )
+            try:
+                future = submit_to_pool(job_id, experiment_name, extra_trees)
+            except Exception as e:
+                # Задача не попала в пул: она не должна считаться активной
+                update_job(
+                    job_id,
+                    status="failed",
+                    error=f"Could not submit training: {e}",
+                    finished_at=time.time(),
+                )
+                (exp_dir / ACTIVE_JOB_FILE).unlink(missing_ok=True)
+                raise
+            (exp_dir / ACTIVE_JOB_FILE).write_text(job_id)
+            future.add_done_callback(lambda f: _on_job_finished(job_id, f))
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    return job
+
+
+def get_active_job(experiment_name: str) -> dict[str, Any] | None:
+    """Get the queued or running job of an experiment, if there is one.
+
+    A job whose owning process is gone is marked as failed and ignored.
+    """
+    active_path = service.get_experiment_dir(experiment_name) / ACTIVE_JOB_FILE
+    try:
+        job = read_job(active_path.read_text().strip())
+    except FileNotFoundError:
+        return None
+    if job is None or job["status"] not in ("queued", "running"):
+        return None
+
+    # Очередь задачи живёт в процессе-воркере, а обучение в процессе пула:
+    # если процесс-владелец умер, задача уже не завершится
+    if not _process_alive(job.get("pid")):
+        update_job(
+            job["job_id"],
+            status="failed",
+            error="Training process terminated",
+            finished_at=time.time(),
+        )
+        return None
+    return job
+
+
+def _process_alive(pid: int | None) -> bool:
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def run_training_job(
+    job_id: str,
+    experiment_name: str,
+    extra_trees: int | None = None,
+) -> None:
+    """Train a model inside a pool process, recording progress in the job state."""
+    update_job(job_id, status="running", pid=os.getpid(), started_at=time.time())
+    try:
+        service.train_model(
+            experiment_name,
+            on_progress=lambda progress: update_job(job_id, progress=progress),
+            extra_trees=extra_trees,
+        )
+    except Exception as e:
+        update_job(
+            job_id,
+            status="failed",
+            error=str(e),
+            finished_at=time.time(),
+        )
+        raise
+    update_job(job_id, status="done", progress=1.0, finished_at=time.time())
+
+
+def _on_job_finished(job_id: str, future: Future) -> None:
+    """Mark jobs whose pool process died without reporting as failed."""
+    if future.cancelled():
+        update_job(job_id, status="failed", error="Job was cancelled")
+        return
+    job = read_job(job_id)
+    if job is not None and job["status"] in ("queued", "running"):
+        update_job(
+            job_id,
+            status="failed",
+            error=f"Training process terminated: {future.exception()}",
+            finished_at=time.time(),
+        )
@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterable
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS experiments (
+    name TEXT PRIMARY KEY,
+    trained INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    trained_at REAL
+)
+"""
+
+
+class ExperimentRegistry:
+    """Index of experiments and their trained status in an SQLite file.
+
+    The file lives next to the experiment directories, so every worker and
+    training process shares it. A missing file is rebuilt from the
+    directories listed by `scan`, which yields (name, trained) pairs.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        scan: Callable[[], Iterable[tuple[str, bool]]],
+    ) -> None:
+        """Initialize the registry stored at `path`."""
+        self.path = path
+        self._scan = scan
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Соединение своё у каждого потока и процесса: sqlite3 не разрешает
+        # использовать одно соединение из разных потоков
+        pid, conn = getattr(self._local, "conn", (None, None))
+        if conn is not None and pid == os.getpid():
+            return conn
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        created = not self.path.exists()
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        # Журнал отката, а не WAL: runs/ может лежать в сетевом хранилище,
+        # а WAL требует общей памяти процессов одного хоста. Файлы, ранее
+        # переведённые в WAL, возвращаются к журналу отката
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.execute(_SCHEMA)
+        self._local.conn = (os.getpid(), conn)
+        if created:
+            self.rebuild()
+        return conn
+
+    def rebuild(self) -> None:
+        """Replace the index with the experiments found on disk."""
+        now = time.time()
+        rows = [
+            (name, int(trained), now, now if trained else None)
+            for name, trained in self._scan()
+        ]
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM experiments")
+            conn.executemany(
+                "INSERT INTO experiments VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+    def add(self, name: str) -> None:
+        """Register a new untrained experiment."""
+        self._connect().execute(
+            "INSERT OR REPLACE INTO experiments VALUES (?, 0, ?, NULL)",
+            (name, time.time()),
+        )
+
+    def set_trained(self, name: str, trained: bool = True) -> None:
+        """Record whether the experiment has a trained model."""
+        self._connect().execute(
+            "UPDATE experiments SET trained = ?, trained_at = ? WHERE name = ?",
+            (int(trained), time.time() if trained else None, name),
+        )
+
+    def exists(self, name: str) -> bool:
+        """Check whether an experiment is registered."""
+        row = self._connect().execute(
+            "SELECT 1 FROM experiments WHERE name = ?",
+            (name,),
+        ).fetchone()
+        return row is not None
+
+    def is_trained(self, name: str) -> bool:
+        """Check whether an experiment has a trained model."""
+        row = self._connect().execute(
+            "SELECT trained FROM experiments WHERE name = ?",
+            (name,),
+        ).fetchone()
+        return row is not None and bool(row[0])
+
+    def names(self, offset: int = 0, limit: int | None = None) -> list[str]:
+        """List experiment names in alphabetical order."""
+        rows = self._connect().execute(
+            "SELECT name FROM experiments ORDER BY name LIMIT ? OFFSET ?",
+            (-1 if limit is None else limit, offset),
+        )
+        return [name for name, in rows]
+
+    def count(self) -> int:
+        """Count registered experiments."""
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM experiments"
+        ).fetchone()[0]
@@ -1,20 +1,43 @@
-import io
-from typing import Annotated
-
-import pandas as pd
-from fastapi import APIRouter, File, HTTPException, Query, UploadFile, status
+import asyncio
+import json
+import os
+from typing import Annotated, AsyncIterator, Literal, Union
+
+from fastapi import (
+    APIRouter,
+    Body,
+    File,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+    status,
+)
+from fastapi.responses import StreamingResponse
 
+from src.experiments.batching import prediction_batcher
+from src.experiments.executor import lag_monitor, run_blocking
 from src.experiments.schemas import (
+    BatchingStats,
     ConvergenceHistoryResponse,
+    EventLoopLagStats,
     ExistingExperimentsResponse,
     ExperimentConfig,
     ExperimentConfigResponse,
+    MetricsResponse,
+    ModelCacheStats,
     NeedsTrainingResponse,
     PredictResponse,
+    TrainJobResponse,
     TrainResponse,
 )
-from src.experiments import service
+from src.experiments import formats, jobs, service
+
 
+PROGRESS_POLL_INTERVAL = float(os.environ.get("PROGRESS_POLL_INTERVAL", 0.5))
+PROGRESS_KEEPALIVE = 15.0
 
 experiments_router = APIRouter(prefix="", tags=["Experiments"])
 
@@ -23,10 +46,17 @@ experiments_router = APIRouter(prefix="", tags=["Experiments"])
     path="/existing_experiments/",
     response_model=ExistingExperimentsResponse
 )
-async def get_existing_experiments() -> ExistingExperimentsResponse:
-    """Get list of all existing experiments."""
-    names = service.get_existing_experiments()
-    return ExistingExperimentsResponse(experiment_names=names)
+async def get_existing_experiments(
+    offset: Annotated[int, Query(ge=0, description="Number of names to skip")] = 0,
+    limit: Annotated[
+        int | None,
+        Query(ge=1, description="Maximum number of names, all by default")
+    ] = None,
+) -> ExistingExperimentsResponse:
+    """Get a page of existing experiment names and their total number."""
+    names = await run_blocking(service.get_existing_experiments, offset, limit)
+    total = await run_blocking(service.count_experiments)
+    return ExistingExperimentsResponse(experiment_names=names, total=total)
 
 
 @experiments_router.post(
@@ -49,23 +79,39 @@ async def register_experiment(
             detail=f"Invalid config JSON: {str(e)}"
         )
 
-    if service.experiment_exists(experiment_config.name):
+    if await run_blocking(service.experiment_exists, experiment_config.name):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Experiment '{experiment_config.name}' already exists"
         )
 
-    contents = await train_file.read()
-    df = pd.read_csv(io.BytesIO(contents))
+    # Starlette уже сбросил загрузку во временный файл: проверяем заголовок
+    # и разбираем файл по частям, не читая его целиком в память
+    try:
+        columns = await run_blocking(service.read_csv_header, train_file.file)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid CSV file: {str(e)}"
+        )
 
-    if experiment_config.target_column not in df.columns:
+    if experiment_config.target_column not in columns:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Target column '{experiment_config.target_column}' not found"
         )
 
-    service.save_experiment_config(experiment_config)
-    service.save_training_data(experiment_config.name, df)
+    try:
+        await run_blocking(
+            service.register_experiment,
+            experiment_config,
+            train_file.file,
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid training data: {str(e)}"
+        )
 
     return TrainResponse(
         success=True,
@@ -82,13 +128,13 @@ async def get_experiment_config(
     experiment_name: Annotated[str, Query(description="Name of the experiment")]
 ) -> ExperimentConfigResponse:
     """Get configuration of an existing experiment."""
-    if not service.experiment_exists(experiment_name):
+    if not await run_blocking(service.experiment_exists, experiment_name):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Experiment '{experiment_name}' not found"
         )
 
-    config = service.load_experiment_config(experiment_name)
+    config = await run_blocking(service.load_experiment_config, experiment_name)
     return ExperimentConfigResponse(**config.model_dump())
 
 
@@ -100,43 +146,149 @@ async def needs_training(
     experiment_name: Annotated[str, Query(description="Name of the experiment")]
 ) -> NeedsTrainingResponse:
     """Check if model needs training."""
-    if not service.experiment_exists(experiment_name):
+    if not await run_blocking(service.experiment_exists, experiment_name):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Experiment '{experiment_name}' not found"
         )
 
-    needs = not service.model_is_trained(experiment_name)
+    needs = not await run_blocking(service.model_is_trained, experiment_name)
     return NeedsTrainingResponse(response=needs)
 
 
 @experiments_router.post(
     path="/train/",
-    response_model=TrainResponse
+    response_model=TrainJobResponse
 )
 async def train_model(
     experiment_name: Annotated[str, Query(description="Name of the experiment")]
-) -> TrainResponse:
-    """Train model for the specified experiment."""
-    if not service.experiment_exists(experiment_name):
+) -> TrainJobResponse:
+    """Enqueue training of the model for the specified experiment."""
+    if not await run_blocking(service.experiment_exists, experiment_name):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Experiment '{experiment_name}' not found"
         )
 
     try:
-        service.train_model(experiment_name)
-        return TrainResponse(
-            success=True,
-            message=f"Model for '{experiment_name}' trained successfully",
-            experiment_name=experiment_name,
+        job = await run_blocking(jobs.submit_training, experiment_name)
+    except jobs.TrainingConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
         )
-    except Exception as e:
+    return TrainJobResponse(**job)
+
+
+@experiments_router.post(
+    path="/continue_training/",
+    response_model=TrainJobResponse
+)
+async def continue_training(
+    experiment_name: Annotated[str, Query(description="Name of the experiment")],
+    extra_trees: Annotated[int, Query(ge=1, description="Number of trees to add")],
+) -> TrainJobResponse:
+    """Enqueue growing the trained model of an experiment by more trees.
+
+    The new trees continue the current model version: further bootstraps
+    for Random Forest and further boosting steps for Gradient Boosting.
+    """
+    if not await run_blocking(service.experiment_exists, experiment_name):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Experiment '{experiment_name}' not found"
+        )
+
+    if not await run_blocking(service.model_is_trained, experiment_name):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Model for '{experiment_name}' has not been trained yet"
+        )
+
+    try:
+        job = await run_blocking(jobs.submit_training, experiment_name, extra_trees)
+    except jobs.TrainingConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    return TrainJobResponse(**job)
+
+
+@experiments_router.get(
+    path="/train_status/",
+    response_model=TrainJobResponse
+)
+async def get_train_status(
+    job_id: Annotated[str, Query(description="ID of the training job")]
+) -> TrainJobResponse:
+    """Get status and progress of a training job."""
+    job = await run_blocking(jobs.read_job, job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Training job '{job_id}' not found"
+        )
+
+    return TrainJobResponse(**job)
+
+
+@experiments_router.get(
+    path="/train_progress/",
+    response_class=StreamingResponse,
+)
+async def stream_train_progress(
+    request: Request,
+    experiment_name: Annotated[str, Query(description="Name of the experiment")]
+) -> StreamingResponse:
+    """Stream per-tree losses and timings of training as Server-Sent Events.
+
+    Every fitted tree is sent as a `progress` event with a JSON object of
+    the iteration, train and validation RMSLE and elapsed seconds. The
+    stream replays the current or last training run and ends with a
+    `done` or `failed` event.
+    """
+    if not await run_blocking(service.experiment_exists, experiment_name):
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Training failed: {str(e)}"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Experiment '{experiment_name}' not found"
         )
 
+    async def events() -> AsyncIterator[str]:
+        offset, inode = 0, None
+        idle = 0.0
+        while not await request.is_disconnected():
+            records, offset, inode = await run_blocking(
+                service.read_progress,
+                experiment_name,
+                offset,
+                inode,
+            )
+            # Модель обучена до появления файла прогресса: показывать нечего
+            if inode is None and await run_blocking(
+                service.model_is_trained, experiment_name
+            ):
+                return
+
+            for record in records:
+                event = record.get("status", "progress")
+                yield f"event: {event}\ndata: {json.dumps(record)}\n\n"
+                if event != "progress":
+                    return
+
+            idle = 0.0 if records else idle + PROGRESS_POLL_INTERVAL
+            if idle >= PROGRESS_KEEPALIVE:
+                # Комментарий SSE не даёт прокси закрыть молчащее соединение
+                idle = 0.0
+                yield ": keepalive\n\n"
+            await asyncio.sleep(PROGRESS_POLL_INTERVAL)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
 
 @experiments_router.get(
     path="/convergence_history/",
@@ -146,19 +298,19 @@ async def get_convergence_history(
     experiment_name: Annotated[str, Query(description="Name of the experiment")]
 ) -> ConvergenceHistoryResponse:
     """Get convergence history (learning curves) for experiment."""
-    if not service.experiment_exists(experiment_name):
+    if not await run_blocking(service.experiment_exists, experiment_name):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Experiment '{experiment_name}' not found"
         )
 
-    if not service.model_is_trained(experiment_name):
+    if not await run_blocking(service.model_is_trained, experiment_name):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Model for '{experiment_name}' has not been trained yet"
         )
 
-    return service.get_convergence_history(experiment_name)
+    return await run_blocking(service.get_convergence_history, experiment_name)
 
 
 @experiments_router.post(
@@ -168,22 +320,229 @@ async def get_convergence_history(
 async def predict(
     experiment_name: Annotated[str, Query(description="Name of the experiment")],
     test_file: Annotated[UploadFile, File(description="Test CSV file")],
-) -> PredictResponse:
-    """Make predictions using trained model."""
-    if not service.experiment_exists(experiment_name):
+    accept: Annotated[
+        str | None,
+        Header(description="JSON (default), .npy, raw float32/float64 or Arrow IPC")
+    ] = None,
+    n_trees: Annotated[
+        int | None,
+        Query(ge=1, description="Number of leading trees to use, all by default")
+    ] = None,
+) -> Response:
+    """Make predictions using trained model.
+
+    The output format is chosen by the Accept header: `application/json`,
+    `application/x-npy`, `application/octet-stream; dtype=float32|float64`
+    (raw little-endian) or `application/vnd.apache.arrow.stream`. With
+    `n_trees` only the leading trees are used, e.g. the best iteration
+    reported by `/convergence_history/`.
+    """
+    try:
+        media_type, dtype = formats.negotiate(accept)
+    except formats.NotAcceptableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail=str(e)
+        )
+
+    if not await run_blocking(service.experiment_exists, experiment_name):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Experiment '{experiment_name}' not found"
+        )
+
+    if not await run_blocking(service.model_is_trained, experiment_name):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Model for '{experiment_name}' has not been trained yet"
+        )
+
+    try:
+        # Небольшие запросы объединяются с параллельными в один батч
+        X = None
+        if prediction_batcher.enabled:
+            X = await run_blocking(
+                service.read_csv_features,
+                experiment_name,
+                test_file.file,
+                prediction_batcher.max_rows,
+            )
+        if X is not None:
+            predictions = await prediction_batcher.predict(
+                experiment_name, X, n_trees
+            )
+        else:
+            predictions = await run_blocking(
+                service.predict_csv,
+                experiment_name,
+                test_file.file,
+                n_trees,
+            )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid test data: {str(e)}"
+        )
+
+    content = await run_blocking(
+        formats.encode_predictions,
+        predictions,
+        media_type,
+        dtype,
+    )
+    if dtype:
+        media_type = f"{media_type}; dtype={dtype}"
+    return Response(content=content, media_type=media_type)
+
+
+@experiments_router.post(
+    path="/predict_rows/",
+    response_model=PredictResponse
+)
+async def predict_rows(
+    experiment_name: Annotated[str, Query(description="Name of the experiment")],
+    rows: Annotated[
+        Union[list[dict[str, float | None]], dict[str, list[float | None]]],
+        Body(description="Rows or columns of features keyed by column name")
+    ],
+    accept: Annotated[
+        str | None,
+        Header(description="JSON (default), .npy, raw float32/float64 or Arrow IPC")
+    ] = None,
+    n_trees: Annotated[
+        int | None,
+        Query(ge=1, description="Number of leading trees to use, all by default")
+    ] = None,
+) -> Response:
+    """Make predictions for feature rows sent as JSON.
+
+    The body is a list of objects mapping column names to values or a
+    columnar object mapping column names to lists of values. Columns are
+    matched by name against the training data and null means a missing
+    value. The output format is negotiated as in `/predict/`.
+    """
+    try:
+        media_type, dtype = formats.negotiate(accept)
+    except formats.NotAcceptableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail=str(e)
+        )
+
+    try:
+        X = await run_blocking(service.records_to_features, experiment_name, rows)
+        predictions = await prediction_batcher.predict(experiment_name, X, n_trees)
+    except (FileNotFoundError, ValueError) as e:
+        # Существование эксперимента и модели проверяем только после ошибки,
+        # чтобы не добавлять к каждому запросу лишние обращения к диску
+        if not await run_blocking(service.experiment_exists, experiment_name):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Experiment '{experiment_name}' not found"
+            )
+        if not await run_blocking(service.model_is_trained, experiment_name):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Model for '{experiment_name}' has not been trained yet"
+            )
+        if isinstance(e, ValueError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid feature rows: {str(e)}"
+            )
+        raise
+
+    # Ответ на несколько строк кодируем прямо в event loop: это быстрее,
+    # чем ещё один переход в пул потоков
+    content = formats.encode_predictions(predictions, media_type, dtype)
+    if dtype:
+        media_type = f"{media_type}; dtype={dtype}"
+    return Response(content=content, media_type=media_type)
+
+
+@experiments_router.post(
+    path="/predict_stream/",
+    response_class=StreamingResponse,
+)
+async def predict_stream(
+    experiment_name: Annotated[str, Query(description="Name of the experiment")],
+    test_file: Annotated[UploadFile, File(description="Test CSV file")],
+    fmt: Annotated[
+        Literal["ndjson", "csv"],
+        Query(description="Output format: one prediction per line")
+    ] = "ndjson",
+    n_trees: Annotated[
+        int | None,
+        Query(ge=1, description="Number of leading trees to use, all by default")
+    ] = None,
+) -> StreamingResponse:
+    """Stream predictions chunk by chunk while the test file is being parsed."""
+    if not await run_blocking(service.experiment_exists, experiment_name):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Experiment '{experiment_name}' not found"
         )
 
-    if not service.model_is_trained(experiment_name):
+    if not await run_blocking(service.model_is_trained, experiment_name):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Model for '{experiment_name}' has not been trained yet"
         )
 
-    contents = await test_file.read()
-    df = pd.read_csv(io.BytesIO(contents))
+    if n_trees is not None:
+        # Ошибку нужно вернуть до начала потока, а не посреди него
+        model = await run_blocking(service.get_model, experiment_name)
+        if n_trees > model.n_estimators:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Model has only {model.n_estimators} trees"
+            )
+
+    predictions = service.iter_predictions(
+        experiment_name,
+        service.iter_csv_chunks(test_file.file),
+        n_trees,
+    )
+
+    # Первая часть предсказывается до ответа: ошибки в заголовке и форме
+    # данных возвращаются кодом 400, а не обрывают поток со статусом 200
+    try:
+        chunk = await run_blocking(next, predictions, None)
+    except Exception as e:
+        predictions.close()
+        if isinstance(e, ValueError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid test data: {str(e)}"
+            )
+        raise
+
+    async def body() -> AsyncIterator[str]:
+        nonlocal chunk
+        if fmt == "csv":
+            yield "prediction\n"
+        # Разбор и предсказание очередной части идут в пуле потоков
+        try:
+            while chunk is not None:
+                if len(chunk):
+                    yield "\n".join(map(str, chunk.tolist())) + "\n"
+                chunk = await run_blocking(next, predictions, None)
+        finally:
+            # Закрываем чтение CSV, пока загруженный файл ещё открыт
+            predictions.close()
+
+    media_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return StreamingResponse(body(), media_type=media_type)
+
 
-    predictions = service.predict(experiment_name, df)
-    return PredictResponse(predictions=predictions)
+@experiments_router.get(
+    path="/metrics/",
+    response_model=MetricsResponse
+)
+async def get_metrics() -> MetricsResponse:
+    """Get service metrics: model cache, event loop lag and batching."""
+    return MetricsResponse(
+        model_cache=ModelCacheStats(**service.model_cache.stats()),
+        event_loop=EventLoopLagStats(**lag_monitor.stats()),
+        batching=BatchingStats(**prediction_batcher.stats()),
+    )
@@ -1,6 +1,6 @@
 from typing import Annotated, Literal, Union
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 
 class ExperimentConfig(BaseModel):
@@ -22,6 +22,41 @@ class ExperimentConfig(BaseModel):
     learning_rate: Annotated[float, Field(gt=0, le=1)] = Field(
         default=0.1, description="Learning rate for Gradient Boosting"
     )
+    tree_method: Literal["exact", "hist"] = Field(
+        default="exact",
+        description="Tree learner: exact sklearn splits or histograms of binned features"
+    )
+    max_bins: Annotated[int, Field(
+        ge=2, le=255, description="Maximum number of bins per feature for the 'hist' tree method"
+    )] = 255
+    subsample: Annotated[float, Field(
+        gt=0, le=1, description="Fraction of rows every Gradient Boosting tree is fit on"
+    )] = 1.0
+    goss_top_rate: Union[Annotated[float, Field(gt=0, lt=1)], None] = Field(
+        default=None,
+        description="Gradient-based one-side sampling: fraction of rows with the largest residuals always kept, less than subsample"
+    )
+    colsample_bytree: Annotated[float, Field(
+        gt=0, le=1, description="Fraction of columns every Gradient Boosting tree is fit on"
+    )] = 1.0
+    dtype: Literal["float64", "float32"] = Field(
+        default="float64",
+        description="Floating type of targets, predictions and stored leaf values; float32 halves their memory"
+    )
+    validation: Literal["holdout", "oob"] = Field(
+        default="holdout",
+        description="Validation curve: last 20% of the rows held out, or out-of-bag objects of a Random Forest trained on all rows"
+    )
+
+    @model_validator(mode="after")
+    def check_goss_top_rate(self) -> "ExperimentConfig":
+        """Reject one-side sampling that keeps no room for random rows."""
+        if self.goss_top_rate is not None and self.goss_top_rate >= self.subsample:
+            raise ValueError(
+                f"goss_top_rate must be less than subsample={self.subsample}, "
+                f"got {self.goss_top_rate}"
+            )
+        return self
 
 
 class ExperimentConfigResponse(ExperimentConfig):
@@ -37,6 +72,17 @@ class TrainResponse(BaseModel):
     experiment_name: str
 
 
+class TrainJobResponse(BaseModel):
+    """State of a background training job."""
+
+    job_id: str
+    experiment_name: str
+    status: Literal["queued", "running", "done", "failed"]
+    progress: float = 0.0
+    error: Union[str, None] = None
+    extra_trees: Union[int, None] = None
+
+
 class PredictResponse(BaseModel):
     """Response from prediction endpoint."""
 
@@ -48,15 +94,56 @@ class ConvergenceHistoryResponse(BaseModel):
 
     train: list[float]
     val: list[float] | None = None
+    oob: list[float] | None = None
+    best_iteration: int | None = None
 
 
 class ExistingExperimentsResponse(BaseModel):
     """Response with list of existing experiments."""
 
     experiment_names: list[str] = []
+    total: int = 0
 
 
 class NeedsTrainingResponse(BaseModel):
     """Response indicating if model needs training."""
 
     response: bool
+
+
+class ModelCacheStats(BaseModel):
+    """Counters of the in-process model cache."""
+
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    bytes: int
+    max_bytes: int
+
+
+class EventLoopLagStats(BaseModel):
+    """Event loop lag over the recent sampling window, in milliseconds."""
+
+    last_ms: float
+    mean_ms: float
+    max_ms: float
+    samples: int
+
+
+class BatchingStats(BaseModel):
+    """Counters of the prediction request coalescer."""
+
+    enabled: bool
+    batches: int
+    requests: int
+    rows: int
+    mean_requests_per_batch: float
+
+
+class MetricsResponse(BaseModel):
+    """Response with service metrics."""
+
+    model_cache: ModelCacheStats
+    event_loop: EventLoopLagStats
+    batching: BatchingStats
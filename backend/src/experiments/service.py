@@ -1,8 +1,12 @@
+import errno
 import json
-import math
+import os
+import shutil
 import sys
+import uuid
+from contextlib import closing
 from pathlib import Path
-from typing import Union
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, Union
 
 import numpy as np
 import pandas as pd
@@ -11,8 +15,10 @@ sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
 
 from ensembles.boosting import GradientBoostingMSE
 from ensembles.random_forest import RandomForestMSE
-from ensembles.utils import ConvergenceHistory
+from ensembles.utils import ConvergenceHistory, TrainingProgress
 
+from src.experiments.cache import ModelCache
+from src.experiments.registry import ExperimentRegistry
 from src.experiments.schemas import (
     ConvergenceHistoryResponse,
     ExperimentConfig,
@@ -20,6 +26,24 @@ from src.experiments.schemas import (
 
 
 RUNS_DIR = Path(__file__).resolve().parents[3] / "runs"
+FEATURES_FILE = "features.f32"
+# Матрица признаков во float64 и порядке C у экспериментов, сохранённых раньше
+LEGACY_FEATURES_FILE = "features.f64"
+TARGET_FILE = "target.f64"
+DATA_SCHEMA_FILE = "data_schema.json"
+REGISTRY_FILE = "registry.sqlite3"
+PROGRESS_FILE = "progress.ndjson"
+MODELS_DIR = "models"
+CURRENT_FILE = "current"
+HISTORY_FILE = "convergence_history.json"
+MODEL_VERSIONS_KEEP = int(os.environ.get("MODEL_VERSIONS_KEEP", 3))
+CSV_CHUNK_ROWS = int(os.environ.get("CSV_CHUNK_ROWS", 100_000))
+MODEL_CACHE_MAX_BYTES = int(os.environ.get("MODEL_CACHE_MAX_BYTES", 1 << 30))
+# Деревья сравнивают признаки во float32, поэтому признаки для предсказания
+# сразу строятся в нём и не копируются ещё раз внутри модели
+FEATURE_DTYPE = np.float32
+
+model_cache = ModelCache(max_bytes=MODEL_CACHE_MAX_BYTES)
 
 
 def get_runs_dir() -> Path:
@@ -33,17 +57,32 @@ def get_experiment_dir(experiment_name: str) -> Path:
     return get_runs_dir() / experiment_name
 
 
-def get_existing_experiments() -> list[str]:
-    """Get list of existing experiment names."""
-    runs_dir = get_runs_dir()
-    if not runs_dir.exists():
-        return []
-    return [d.name for d in runs_dir.iterdir() if d.is_dir()]
+def scan_experiments() -> Iterator[tuple[str, bool]]:
+    """Find experiment directories on disk with their trained status."""
+    for exp_dir in get_runs_dir().iterdir():
+        if exp_dir.is_dir() and not exp_dir.name.startswith("."):
+            yield exp_dir.name, get_model_dir(exp_dir.name) is not None
+
+
+registry = ExperimentRegistry(RUNS_DIR / REGISTRY_FILE, scan=scan_experiments)
+
+
+def get_existing_experiments(
+    offset: int = 0,
+    limit: int | None = None,
+) -> list[str]:
+    """Get a page of existing experiment names in alphabetical order."""
+    return registry.names(offset, limit)
+
+
+def count_experiments() -> int:
+    """Get the number of existing experiments."""
+    return registry.count()
 
 
 def experiment_exists(experiment_name: str) -> bool:
     """Check if experiment already exists."""
-    return experiment_name in get_existing_experiments()
+    return registry.exists(experiment_name)
 
 
 def save_experiment_config(config: ExperimentConfig) -> None:
@@ -51,9 +90,12 @@ def save_experiment_config(config: ExperimentConfig) -> None:
     exp_dir = get_experiment_dir(config.name)
     exp_dir.mkdir(parents=True, exist_ok=True)
 
+    # Конфиг переписывается и после дообучения: читатели видят его целиком
     config_path = exp_dir / "config.json"
-    with config_path.open("w") as f:
+    tmp_path = config_path.with_suffix(f".{os.getpid()}.tmp")
+    with tmp_path.open("w") as f:
         json.dump(config.model_dump(), f, indent=2)
+    os.replace(tmp_path, config_path)
 
 
 def load_experiment_config(experiment_name: str) -> ExperimentConfig:
@@ -67,25 +109,169 @@ def load_experiment_config(experiment_name: str) -> ExperimentConfig:
     return ExperimentConfig(**data)
 
 
-def save_training_data(experiment_name: str, df: pd.DataFrame) -> None:
-    """Save training data to experiment directory."""
+def read_csv_header(csv_file: BinaryIO) -> list[str]:
+    """Read column names from the header of a CSV file and rewind it."""
+    columns = pd.read_csv(csv_file, nrows=0).columns
+    csv_file.seek(0)
+    return [str(c) for c in columns]
+
+
+def iter_csv_chunks(csv_file: BinaryIO) -> Iterator[pd.DataFrame]:
+    """Parse a CSV file incrementally in frames of at most CSV_CHUNK_ROWS rows."""
+    with pd.read_csv(csv_file, chunksize=CSV_CHUNK_ROWS) as reader:
+        yield from reader
+
+
+def save_training_data(
+    experiment_name: str,
+    chunks: Iterable[pd.DataFrame],
+    target_column: str,
+) -> None:
+    """Save training data as a float32 feature matrix and float64 targets.
+
+    Chunks are appended to raw little-endian binaries as they come, so
+    memory use is bounded by one chunk. The feature matrix is then
+    rewritten in column-major order: trees compare features in float32
+    and search splits column by column, so training uses the memory-mapped
+    matrix without copying it. A JSON schema with column names and shape
+    is written next to the arrays. Raises ValueError if some column is not
+    numeric or does not fit in float32.
+    """
     exp_dir = get_experiment_dir(experiment_name)
-    data_path = exp_dir / "train_data.csv"
-    df.to_csv(data_path, index=False)
+    exp_dir.mkdir(parents=True, exist_ok=True)
+
+    feature_columns: list[str] = []
+    n_rows = 0
+    rows_path = exp_dir / f"{FEATURES_FILE}.rows"
+    with (
+        rows_path.open("wb") as rows_file,
+        (exp_dir / TARGET_FILE).open("wb") as target_file,
+    ):
+        for df in chunks:
+            feature_columns = [str(c) for c in df.columns if c != target_column]
+            # Слишком большие для float32 значения становятся бесконечностями
+            with np.errstate(over="ignore"):
+                X = df.drop(columns=[target_column]).to_numpy(dtype="<f4")
+            y = df[target_column].to_numpy(dtype="<f8")
+            if np.isinf(X).any():
+                raise ValueError("features contain infinity or values too large for float32")
+            rows_file.write(X.tobytes())
+            target_file.write(y.tobytes())
+            n_rows += len(y)
+
+    _transpose_features(rows_path, exp_dir / FEATURES_FILE, n_rows, len(feature_columns))
+    rows_path.unlink()
+
+    schema = {
+        "feature_columns": feature_columns,
+        "target_column": target_column,
+        "n_rows": n_rows,
+        "features_file": FEATURES_FILE,
+        "dtype": "<f4",
+        "order": "F",
+        "target_dtype": "<f8",
+    }
+    with (exp_dir / DATA_SCHEMA_FILE).open("w") as f:
+        json.dump(schema, f, indent=2)
+
+
+def _transpose_features(
+    rows_path: Path,
+    columns_path: Path,
+    n_rows: int,
+    n_features: int,
+) -> None:
+    """Rewrite a row-major float32 matrix file in column-major order."""
+    if n_rows == 0 or n_features == 0:
+        columns_path.write_bytes(b"")
+        return
+
+    rows = np.memmap(rows_path, dtype="<f4", mode="r", shape=(n_rows, n_features))
+    columns = np.memmap(
+        columns_path,
+        dtype="<f4",
+        mode="w+",
+        shape=(n_rows, n_features),
+        order="F",
+    )
+    # Блоками строк: в памяти не больше одного блока
+    for start in range(0, n_rows, CSV_CHUNK_ROWS):
+        columns[start:start + CSV_CHUNK_ROWS] = rows[start:start + CSV_CHUNK_ROWS]
+    columns.flush()
+
+
+def load_data_schema(experiment_name: str) -> dict:
+    """Load column names and shape of the stored training data."""
+    exp_dir = get_experiment_dir(experiment_name)
+    with (exp_dir / DATA_SCHEMA_FILE).open("r") as f:
+        return json.load(f)
 
 
 def load_training_data(experiment_name: str) -> pd.DataFrame:
-    """Load training data from experiment directory."""
+    """Load legacy CSV training data from experiment directory."""
     exp_dir = get_experiment_dir(experiment_name)
     data_path = exp_dir / "train_data.csv"
     return pd.read_csv(data_path)
 
 
+def load_training_arrays(
+    experiment_name: str
+) -> tuple[np.ndarray, np.ndarray]:
+    """Memory-map the stored feature matrix and target vector.
+
+    Experiments registered with CSV training data are converted on first use.
+    Matrices stored before the column-major float32 layout are mapped as
+    they are.
+    """
+    exp_dir = get_experiment_dir(experiment_name)
+    if not (exp_dir / DATA_SCHEMA_FILE).exists():
+        config = load_experiment_config(experiment_name)
+        save_training_data(
+            experiment_name,
+            [load_training_data(experiment_name)],
+            config.target_column,
+        )
+        (exp_dir / "train_data.csv").unlink()
+
+    schema = load_data_schema(experiment_name)
+    n_rows = schema["n_rows"]
+    n_features = len(schema["feature_columns"])
+
+    X = np.memmap(
+        exp_dir / schema.get("features_file", LEGACY_FEATURES_FILE),
+        dtype=schema["dtype"],
+        mode="r",
+        shape=(n_rows, n_features),
+        order=schema.get("order", "C"),
+    )
+    y = np.memmap(
+        exp_dir / TARGET_FILE,
+        dtype=schema.get("target_dtype", schema["dtype"]),
+        mode="r",
+        shape=(n_rows,),
+    )
+    return X, y
+
+
+def register_experiment(config: ExperimentConfig, csv_file: BinaryIO) -> None:
+    """Create an experiment with its config and training data from a CSV file.
+
+    The file is parsed in chunks. A partially written experiment directory
+    is removed on failure.
+    """
+    try:
+        with closing(iter_csv_chunks(csv_file)) as chunks:
+            save_training_data(config.name, chunks, config.target_column)
+        save_experiment_config(config)
+    except Exception:
+        shutil.rmtree(get_experiment_dir(config.name), ignore_errors=True)
+        raise
+    registry.add(config.name)
+
+
 def model_is_trained(experiment_name: str) -> bool:
     """Check if model has been trained."""
-    exp_dir = get_experiment_dir(experiment_name)
-    model_dir = exp_dir / "model"
-    return model_dir.exists() and (model_dir / "params.json").exists()
+    return registry.is_trained(experiment_name)
 
 
 def parse_max_features(
@@ -108,14 +294,83 @@ def parse_max_features(
     return max_features
 
 
-def train_model(experiment_name: str) -> ConvergenceHistory:
-    """Train model for the specified experiment."""
-    config = load_experiment_config(experiment_name)
-    df = load_training_data(experiment_name)
+def _ignore_progress(progress: float) -> None:
+    """Default progress callback that does nothing."""
+
+
+def reset_progress(experiment_name: str) -> Path:
+    """Start an empty progress file for a new training run and return its path."""
+    progress_path = get_experiment_dir(experiment_name) / PROGRESS_FILE
+    # Новый файл подменяет старый целиком, чтобы читатели заметили смену inode
+    tmp_path = progress_path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text("")
+    os.replace(tmp_path, progress_path)
+    return progress_path
+
+
+def train_model(
+    experiment_name: str,
+    on_progress: Callable[[float], None] | None = None,
+    extra_trees: int | None = None,
+) -> ConvergenceHistory:
+    """Train model for the specified experiment.
+
+    With `extra_trees` the current model is grown by that many trees
+    instead of being trained from scratch, and its convergence history is
+    extended. `on_progress` is called with the completed fraction of the
+    work. Per-tree losses and timings are appended to the experiment's
+    progress file, followed by a final record with the training status.
+    """
+    if on_progress is None:
+        on_progress = _ignore_progress
+
+    progress_path = reset_progress(experiment_name)
+    with progress_path.open("a") as progress_file:
+        def write_record(record: dict) -> None:
+            progress_file.write(json.dumps(record) + "\n")
+            progress_file.flush()
+
+        percent = 0
+        first_iteration = None
+
+        def on_tree(progress: TrainingProgress) -> None:
+            nonlocal percent, first_iteration
+            write_record(dict(progress))
+            # При дообучении доля считается только по новым деревьям
+            if first_iteration is None:
+                first_iteration = progress["iteration"]
+            fraction = (progress["iteration"] - first_iteration + 1) / (
+                progress["n_estimators"] - first_iteration + 1
+            )
+            # Состояние задачи переписываем не чаще, чем раз в процент
+            if int(100 * fraction) > percent:
+                percent = int(100 * fraction)
+                on_progress(0.1 + 0.8 * fraction)
+
+        try:
+            convergence_history = _train_model(
+                experiment_name,
+                on_progress,
+                on_tree,
+                extra_trees,
+            )
+        except Exception as e:
+            write_record({"status": "failed", "error": str(e)})
+            raise
+        write_record({"status": "done"})
+    return convergence_history
 
-    target_col = config.target_column
-    X = df.drop(columns=[target_col]).values
-    y = df[target_col].values
+
+def _train_model(
+    experiment_name: str,
+    on_progress: Callable[[float], None],
+    on_tree: Callable[[TrainingProgress], None],
+    extra_trees: int | None = None,
+) -> ConvergenceHistory:
+    """Fit, save and register the model of an experiment."""
+    config = load_experiment_config(experiment_name)
+    X, y = load_training_arrays(experiment_name)
+    on_progress(0.1)
 
     n_features = X.shape[1]
     max_features = parse_max_features(config.max_features, n_features)
@@ -124,21 +379,46 @@ def train_model(experiment_name: str) -> ConvergenceHistory:
         "max_depth": config.max_depth,
         "max_features": max_features,
     }
-
-    train_size = int(0.8 * len(X))
-    X_train, X_val = X[:train_size], X[train_size:]
-    y_train, y_val = y[:train_size], y[train_size:]
-
-    if config.ml_model == "Random Forest":
+    if config.tree_method == "hist":
+        tree_params["tree_method"] = "hist"
+        tree_params["max_bins"] = config.max_bins
+
+    # Out-of-bag оценка заменяет отложенную выборку: лес обучается на всех
+    # строках, а валидационную кривую строят объекты вне бутстрэп-выборок
+    use_oob = config.ml_model == "Random Forest" and config.validation == "oob"
+    if use_oob:
+        X_train, X_val, y_train, y_val = X, None, y, None
+    else:
+        train_size = int(0.8 * len(X))
+        X_train, X_val = X[:train_size], X[train_size:]
+        y_train, y_val = y[:train_size], y[train_size:]
+
+    previous_history = None
+    if extra_trees:
+        # Дообучение: новые деревья добавляются к текущей версии модели
+        model = load_model(experiment_name)
+        model.tree_params = tree_params
+        model.warm_start = True
+        model.n_estimators += extra_trees
+        previous_history = get_convergence_history(experiment_name).model_dump()
+    elif config.ml_model == "Random Forest":
+        # Бутстреп весами: деревья обучаются на общей матрице без копий
         model = RandomForestMSE(
             n_estimators=config.n_estimators,
             tree_params=tree_params,
+            bootstrap="weights",
+            oob_score=use_oob,
+            dtype=config.dtype,
         )
     else:
         model = GradientBoostingMSE(
             n_estimators=config.n_estimators,
             tree_params=tree_params,
             learning_rate=config.learning_rate,
+            subsample=config.subsample,
+            goss_top_rate=config.goss_top_rate,
+            colsample_bytree=config.colsample_bytree,
+            dtype=config.dtype,
         )
 
     convergence_history = model.fit(
@@ -147,32 +427,149 @@ def train_model(experiment_name: str) -> ConvergenceHistory:
         X_val=X_val,
         y_val=y_val,
         trace=True,
+        callback=on_tree,
+        convergence_history=previous_history,
     )
+    on_progress(0.9)
+
+    save_model_version(experiment_name, model, convergence_history)
+    registry.set_trained(experiment_name)
+    if model.n_estimators != config.n_estimators:
+        config.n_estimators = model.n_estimators
+        save_experiment_config(config)
+    return convergence_history
+
+
+def get_model_dir(experiment_name: str) -> Path | None:
+    """Get the directory of the current model version.
 
+    Falls back to the unversioned `model` directory of experiments trained
+    before versioning. Returns None if the model has not been trained.
+    """
     exp_dir = get_experiment_dir(experiment_name)
-    model_dir = exp_dir / "model"
-    if model_dir.exists():
-        import shutil
-        shutil.rmtree(model_dir)
+    models_dir = exp_dir / MODELS_DIR
+    try:
+        version = (models_dir / CURRENT_FILE).read_text().strip()
+    except FileNotFoundError:
+        legacy_dir = exp_dir / "model"
+        return legacy_dir if (legacy_dir / "params.json").exists() else None
+    return models_dir / version
+
+
+def list_model_versions(experiment_name: str) -> list[str]:
+    """List stored model versions from the oldest to the newest."""
+    models_dir = get_experiment_dir(experiment_name) / MODELS_DIR
+    if not models_dir.exists():
+        return []
+    # Сравниваем номера, а не строки: после v9999 идёт v10000
+    return sorted(
+        (
+            d.name for d in models_dir.iterdir()
+            if d.is_dir() and d.name.startswith("v") and d.name[1:].isdigit()
+        ),
+        key=lambda name: int(name[1:]),
+    )
+
 
-    model.dump(str(model_dir))
+def save_model_version(
+    experiment_name: str,
+    model: RandomForestMSE | GradientBoostingMSE,
+    convergence_history: ConvergenceHistory | None,
+) -> str:
+    """Save a model as a new version and make it current.
 
+    The version is written to a temporary directory and renamed into place,
+    then the `current` pointer is replaced atomically, so readers see either
+    the old or the new model in full. Only the last `MODEL_VERSIONS_KEEP`
+    versions are kept. Returns the name of the new version.
+    """
+    models_dir = get_experiment_dir(experiment_name) / MODELS_DIR
+    models_dir.mkdir(parents=True, exist_ok=True)
+
+    tmp_dir = models_dir / f".tmp-{uuid.uuid4().hex}"
+    model.dump(str(tmp_dir))
     if convergence_history:
-        history_path = exp_dir / "convergence_history.json"
         history_data = {
             "train": convergence_history["train"],
             "val": convergence_history.get("val"),
+            "oob": convergence_history.get("oob"),
+            "best_iteration": model.best_iteration_,
         }
-        with history_path.open("w") as f:
+        with (tmp_dir / HISTORY_FILE).open("w") as f:
             json.dump(history_data, f, indent=2)
 
-    return convergence_history
+    # Номер версии может занять параллельное обучение: тогда берём следующий
+    while True:
+        versions = list_model_versions(experiment_name)
+        number = int(versions[-1][1:]) + 1 if versions else 1
+        version = f"v{number:04d}"
+        try:
+            os.rename(tmp_dir, models_dir / version)
+            break
+        except OSError as e:
+            if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                raise
 
+    pointer_tmp = models_dir / f".{CURRENT_FILE}.{uuid.uuid4().hex}"
+    pointer_tmp.write_text(version)
+    os.replace(pointer_tmp, models_dir / CURRENT_FILE)
 
-def get_convergence_history(experiment_name: str) -> ConvergenceHistoryResponse:
-    """Get convergence history for experiment."""
+    _prune_model_versions(experiment_name, keep=version)
+    return version
+
+
+def _prune_model_versions(experiment_name: str, keep: str) -> None:
+    """Remove all but the newest model versions and the legacy model directory.
+
+    Models already loaded from a removed version keep working: their memory
+    maps outlive the deleted files.
+    """
     exp_dir = get_experiment_dir(experiment_name)
-    history_path = exp_dir / "convergence_history.json"
+    stale = list_model_versions(experiment_name)[:-MODEL_VERSIONS_KEEP]
+    for version in stale:
+        if version != keep:
+            shutil.rmtree(exp_dir / MODELS_DIR / version, ignore_errors=True)
+    shutil.rmtree(exp_dir / "model", ignore_errors=True)
+    (exp_dir / HISTORY_FILE).unlink(missing_ok=True)
+
+
+def read_progress(
+    experiment_name: str,
+    offset: int = 0,
+    inode: int | None = None,
+) -> tuple[list[dict], int, int | None]:
+    """Read training progress records appended after `offset`.
+
+    `inode` identifies the file the offset belongs to: once a new training
+    run replaces the file, it is read again from the start. Returns the
+    complete records, the new offset and the inode of the file.
+    """
+    progress_path = get_experiment_dir(experiment_name) / PROGRESS_FILE
+    try:
+        f = progress_path.open("rb")
+    except FileNotFoundError:
+        return [], 0, None
+
+    with f:
+        file_inode = os.fstat(f.fileno()).st_ino
+        if file_inode != inode:
+            offset = 0
+        f.seek(offset)
+        data = f.read()
+
+    # Последняя строка может быть ещё не дописана
+    complete = data[:data.rfind(b"\n") + 1]
+    records = [json.loads(line) for line in complete.splitlines()]
+    return records, offset + len(complete), file_inode
+
+
+def get_convergence_history(experiment_name: str) -> ConvergenceHistoryResponse:
+    """Get convergence history of the current model version."""
+    model_dir = get_model_dir(experiment_name)
+    history_path = model_dir / HISTORY_FILE if model_dir else None
+    if history_path is None or not history_path.exists():
+        # Модели без версий хранили историю в каталоге эксперимента
+        history_path = get_experiment_dir(experiment_name) / HISTORY_FILE
 
     with history_path.open("r") as f:
         data = json.load(f)
@@ -180,34 +577,219 @@ def get_convergence_history(experiment_name: str) -> ConvergenceHistoryResponse:
     return ConvergenceHistoryResponse(**data)
 
 
-def load_model(experiment_name: str):
-    """Load trained model from disk."""
+def load_model(experiment_name: str, model_dir: Path | None = None):
+    """Load trained model from disk, the current version by default."""
     config = load_experiment_config(experiment_name)
-    exp_dir = get_experiment_dir(experiment_name)
-    model_dir = str(exp_dir / "model")
+    if model_dir is None:
+        model_dir = get_model_dir(experiment_name)
+    if model_dir is None:
+        raise FileNotFoundError(f"Model for '{experiment_name}' is not trained")
 
     if config.ml_model == "Random Forest":
-        return RandomForestMSE.load(model_dir)
+        return RandomForestMSE.load(str(model_dir))
     else:
-        return GradientBoostingMSE.load(model_dir)
+        return GradientBoostingMSE.load(str(model_dir))
+
+
+def _get_cached_model(experiment_name: str) -> tuple[Any, list[str] | None]:
+    """Get the current model version and its feature names from the cache.
+
+    Cache entries are keyed by the version name, so a model retrained by
+    another process is loaded on the next request, while requests already
+    holding the previous model finish with it.
+    """
+    model_dir = get_model_dir(experiment_name)
+    if model_dir is None:
+        raise FileNotFoundError(f"Model for '{experiment_name}' is not trained")
+
+    version = model_dir.name
+    if model_dir.name == "model":
+        params_stat = (model_dir / "params.json").stat()
+        version = (params_stat.st_ino, params_stat.st_mtime_ns)
+
+    def loader():
+        nbytes = sum(
+            path.stat().st_size
+            for path in model_dir.rglob("*")
+            if path.is_file()
+        )
+        model = load_model(experiment_name, model_dir)
+        return (model, get_feature_columns(experiment_name)), nbytes
 
+    return model_cache.get(experiment_name, version, loader)
 
-def predict(experiment_name: str, df: pd.DataFrame) -> list[float]:
-    """Make predictions using trained model."""
+
+def get_model(experiment_name: str):
+    """Get the current model version from the in-process cache."""
+    return _get_cached_model(experiment_name)[0]
+
+
+def get_model_feature_columns(experiment_name: str) -> list[str] | None:
+    """Get feature names of the current model from the in-process cache.
+
+    Unlike `get_feature_columns`, the data schema is not read on every call.
+    Returns None if the feature names are unknown. Raises FileNotFoundError
+    if the model has not been trained.
+    """
+    return _get_cached_model(experiment_name)[1]
+
+
+def get_feature_columns(experiment_name: str) -> list[str] | None:
+    """Get feature names of the stored training data.
+
+    Experiments registered with CSV training data take them from its header.
+    Returns None if neither the schema nor the CSV file is available.
+    """
+    try:
+        return load_data_schema(experiment_name)["feature_columns"]
+    except FileNotFoundError:
+        pass
+
+    data_path = get_experiment_dir(experiment_name) / "train_data.csv"
+    try:
+        columns = pd.read_csv(data_path, nrows=0).columns
+    except FileNotFoundError:
+        return None
     config = load_experiment_config(experiment_name)
-    model = load_model(experiment_name)
+    return [str(c) for c in columns if c != config.target_column]
+
+
+def frame_to_features(
+    df: pd.DataFrame,
+    feature_columns: list[str] | None,
+    target_column: str | None,
+) -> np.ndarray:
+    """Build a float32 feature matrix ordered like the training data.
+
+    Columns are matched by name when the training schema is known, so test
+    files may list them in any order. Raises ValueError for missing columns.
+    """
+    if feature_columns is None:
+        if target_column in df.columns:
+            df = df.drop(columns=[target_column])
+        return df.to_numpy(dtype=FEATURE_DTYPE)
+
+    df = df.rename(columns=str)
+    missing = [c for c in feature_columns if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing feature columns: {missing}")
+    return df[feature_columns].to_numpy(dtype=FEATURE_DTYPE)
+
+
+def records_to_features(
+    experiment_name: str,
+    records: Union[list[dict[str, float | None]], dict[str, list[float | None]]],
+) -> np.ndarray:
+    """Build a float32 feature matrix from JSON feature rows.
+
+    `records` is either a list of rows mapping column names to values or a
+    columnar object mapping column names to equally long value lists.
+    Columns are matched by name against the training data, extra ones are
+    ignored and None becomes NaN. Raises ValueError for missing columns and
+    FileNotFoundError if the model has not been trained.
+    """
+    # Имена признаков берутся из кэша моделей, а не из схемы на диске
+    feature_columns = get_model_feature_columns(experiment_name)
+    if feature_columns is None:
+        raise ValueError("Feature names of the training data are unknown")
+
+    # Без pandas: для нескольких строк создание DataFrame дороже самих деревьев
+    if isinstance(records, dict):
+        missing = [c for c in feature_columns if c not in records]
+        if missing:
+            raise ValueError(f"Missing feature columns: {missing}")
+        if len({len(records[c]) for c in feature_columns}) > 1:
+            raise ValueError("Feature columns have different lengths")
+        X = np.array([records[c] for c in feature_columns], dtype=FEATURE_DTYPE).T
+    else:
+        missing = sorted({
+            c for row in records for c in feature_columns if c not in row
+        })
+        if missing:
+            raise ValueError(f"Missing feature columns: {missing}")
+        X = np.array(
+            [[row[c] for c in feature_columns] for row in records],
+            dtype=FEATURE_DTYPE,
+        )
+    return X.reshape(-1, len(feature_columns))
 
-    if config.target_column in df.columns:
-        df = df.drop(columns=[config.target_column])
 
-    X = df.values
-    predictions = model.predict(X)
+def predict_features(
+    experiment_name: str,
+    X: np.ndarray,
+    n_trees: int | None = None,
+) -> np.ndarray:
+    """Predict for an aligned feature matrix, replacing NaN and inf by zero.
+
+    `n_trees` limits prediction to the leading trees of the model.
+    """
+    predictions = get_model(experiment_name).predict(X, n_trees=n_trees)
+    return np.nan_to_num(predictions, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def read_csv_features(
+    experiment_name: str,
+    csv_file: BinaryIO,
+    max_rows: int,
+) -> np.ndarray | None:
+    """Read an aligned feature matrix from a CSV file of at most `max_rows` rows.
+
+    Returns None and rewinds the file if it has more rows than that.
+    """
+    df = pd.read_csv(csv_file, nrows=max_rows + 1)
+    if len(df) > max_rows:
+        csv_file.seek(0)
+        return None
+
+    config = load_experiment_config(experiment_name)
+    return frame_to_features(
+        df,
+        get_model_feature_columns(experiment_name),
+        config.target_column,
+    )
 
-    result = []
-    for p in predictions:
-        if math.isnan(p) or math.isinf(p):
-            result.append(0.0)
-        else:
-            result.append(float(p))
 
-    return result
+def iter_predictions(
+    experiment_name: str,
+    chunks: Iterable[pd.DataFrame],
+    n_trees: int | None = None,
+) -> Iterator[np.ndarray]:
+    """Yield predictions for every frame, with NaN and inf replaced by zero.
+
+    A closable `chunks` iterator is closed when this one stops, so a CSV
+    reader does not outlive the uploaded file on errors.
+    """
+    try:
+        config = load_experiment_config(experiment_name)
+        feature_columns = get_model_feature_columns(experiment_name)
+
+        for df in chunks:
+            X = frame_to_features(df, feature_columns, config.target_column)
+            yield predict_features(experiment_name, X, n_trees)
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+def predict_chunks(
+    experiment_name: str,
+    chunks: Iterable[pd.DataFrame],
+    n_trees: int | None = None,
+) -> np.ndarray:
+    """Make predictions using trained model, one frame at a time."""
+    with closing(iter_predictions(experiment_name, chunks, n_trees)) as parts:
+        predictions = list(parts)
+    if not predictions:
+        return np.empty(0)
+    return np.concatenate(predictions)
+
+
+def predict_csv(
+    experiment_name: str,
+    csv_file: BinaryIO,
+    n_trees: int | None = None,
+) -> np.ndarray:
+    """Make predictions for a CSV file parsed in chunks."""
+    with closing(iter_csv_chunks(csv_file)) as chunks:
+        return predict_chunks(experiment_name, chunks, n_trees)
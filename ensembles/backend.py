@@ -4,7 +4,7 @@ This module re-exports ExperimentConfig for use in ui.py
 """
 from typing import Annotated, Literal, Union
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 
 class ExperimentConfig(BaseModel):
@@ -37,3 +37,53 @@ class ExperimentConfig(BaseModel):
         default=0.1,
         description="Learning rate for Gradient Boosting"
     )
+    tree_method: Literal["exact", "hist"] = Field(
+        default="exact",
+        description="Tree learner: exact sklearn splits or histograms of binned features"
+    )
+    max_bins: Annotated[int, Field(
+        ge=2,
+        le=255,
+        description="Maximum number of bins per feature for the 'hist' tree method"
+    )] = 255
+    subsample: Annotated[float, Field(
+        gt=0,
+        le=1,
+        description="Fraction of rows every Gradient Boosting tree is fit on"
+    )] = 1.0
+    goss_top_rate: Union[Annotated[float, Field(gt=0, lt=1)], None] = Field(
+        default=None,
+        description=(
+            "Gradient-based one-side sampling: fraction of rows with the "
+            "largest residuals always kept, less than subsample"
+        )
+    )
+    colsample_bytree: Annotated[float, Field(
+        gt=0,
+        le=1,
+        description="Fraction of columns every Gradient Boosting tree is fit on"
+    )] = 1.0
+    dtype: Literal["float64", "float32"] = Field(
+        default="float64",
+        description=(
+            "Floating type of targets, predictions and stored leaf values; "
+            "float32 halves their memory"
+        )
+    )
+    validation: Literal["holdout", "oob"] = Field(
+        default="holdout",
+        description=(
+            "Validation curve: last 20% of the rows held out, or out-of-bag "
+            "objects of a Random Forest trained on all rows"
+        )
+    )
+
+    @model_validator(mode="after")
+    def check_goss_top_rate(self) -> "ExperimentConfig":
+        """Reject one-side sampling that keeps no room for random rows."""
+        if self.goss_top_rate is not None and self.goss_top_rate >= self.subsample:
+            raise ValueError(
+                f"goss_top_rate must be less than subsample={self.subsample}, "
+                f"got {self.goss_top_rate}"
+            )
+        return self
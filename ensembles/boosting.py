@@ -1,13 +1,98 @@
 import json
+import time
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
 
 import joblib
 import numpy as np
 import numpy.typing as npt
-from sklearn.tree import DecisionTreeRegressor
 
-from ensembles.utils import ConvergenceHistory
+from ensembles.compiled import FOREST_FILE, CompiledForest
+from ensembles.hist import (
+    TreeRegressor,
+    bin_features,
+    check_features,
+    fit_tree,
+    make_tree,
+)
+from ensembles.utils import ConvergenceHistory, ProgressCallback, check_dtype
+
+
+def _leaf_values(
+        tree: TreeRegressor,
+        X: npt.NDArray[np.float64],
+        columns: npt.NDArray[np.intp] | None = None,
+        dtype: npt.DTypeLike = np.float64
+) -> npt.NDArray[np.float64]:
+    """
+    Predict with a fitted tree by looking up the values of its leaves.
+
+    Args:
+        tree (TreeRegressor): Fitted tree.
+        X (npt.NDArray[np.float64]): Objects features matrix,
+            array of shape (n_objects, n_features).
+        columns (npt.NDArray[np.intp] | None, optional): Columns
+            of `X` the tree was fit on. Defaults to None (all).
+        dtype (npt.DTypeLike, optional): Type the leaf values are
+            stored in by the compiled forest. Defaults to np.float64.
+
+    Returns:
+        npt.NDArray[np.float64]: Values of the leaves the objects
+            fall into, array of shape (n_objects,).
+    """
+    if columns is not None:
+        X = X[:, columns]
+    return tree.tree_.value[tree.apply(X), 0, 0].astype(dtype, copy=False)
+
+
+def _sample_rows(
+        rng: np.random.Generator,
+        residuals: npt.NDArray[np.float64],
+        subsample: float,
+        goss_top_rate: float | None
+) -> tuple[npt.NDArray[np.intp], npt.NDArray[np.float64] | None]:
+    """
+    Choose the rows a boosting step fits its tree on.
+
+    Uniform sampling draws `subsample` of the rows without
+    replacement. Gradient-based one-side sampling (GOSS) keeps the
+    `goss_top_rate` rows with the largest residuals and draws the
+    rest of `subsample` uniformly from the other rows, upweighting
+    them to keep the sums of the residuals unbiased.
+
+    Args:
+        rng (np.random.Generator): Generator of the step.
+        residuals (npt.NDArray[np.float64]): Residuals of all
+            the rows, array of shape (n_objects,).
+        subsample (float): Fraction of the rows to fit on.
+        goss_top_rate (float | None): Fraction of the rows with
+            the largest residuals always kept, None for uniform
+            sampling.
+
+    Returns:
+        tuple[npt.NDArray[np.intp], npt.NDArray[np.float64] | None]:
+            Sorted indices of the sampled rows and their weights,
+            None if all the weights are equal.
+    """
+    n_objects = len(residuals)
+    n_sampled = max(1, int(subsample * n_objects))
+    if goss_top_rate is None:
+        return np.sort(rng.choice(n_objects, n_sampled, replace=False)), None
+
+    # Объекты с большими остатками берутся всегда, остальные - случайно
+    n_top = max(1, int(goss_top_rate * n_objects))
+    order = np.argpartition(-np.abs(residuals), n_top - 1)
+    top, rest = order[:n_top], order[n_top:]
+    n_other = min(max(0, n_sampled - n_top), len(rest))
+    other = rng.choice(rest, n_other, replace=False)
+
+    rows = np.concatenate([top, other])
+    weights = np.ones(len(rows))
+    if n_other:
+        # Вес случайной части восполняет пропущенные объекты с малыми остатками
+        weights[n_top:] = len(rest) / n_other
+    order = np.argsort(rows)
+    return rows[order], weights[order]
 
 
 class GradientBoostingMSE:
@@ -18,30 +103,88 @@ class GradientBoostingMSE:
         n_estimators: int,
         tree_params: dict[str, Any] | None = None,
         learning_rate=0.1,
+        warm_start: bool = False,
+        subsample: float = 1.0,
+        goss_top_rate: float | None = None,
+        colsample_bytree: float = 1.0,
+        random_state: int | None = None,
+        dtype: npt.DTypeLike = np.float64,
     ) -> None:
         """
         Initializes the GradientBoostingMSE model.
 
         This is a handmade gradient boosting regressor that trains a sequence of
         short decision trees to correct the errors of each other's predictions.
-        It employs scikit-learn's `DecisionTreeRegressor` under the hood.
+        It employs scikit-learn's `DecisionTreeRegressor` under the hood,
+        or `HistogramTreeRegressor` with `tree_method='hist'`.
 
         Args:
             n_estimators (int):
                 Number of trees to boost each other.
             tree_params (dict[str, Any] | None, optional):
-                Parameters for the decision trees. Defaults to None.
+                Parameters for the decision trees. The `tree_method` key
+                selects 'exact' sklearn trees or 'hist' trees fitted on
+                features binned once per `fit` into `max_bins` bins.
+                Defaults to None.
             learning_rate (float, optional):
                 Scaling factor for the "gradient" step 
                 (the weight applied to each tree prediction). Defaults to 0.1.
+            warm_start (bool, optional):
+                Whether `fit` keeps the already fitted trees and continues
+                boosting from their predictions up to `n_estimators` trees.
+                Defaults to False.
+            subsample (float, optional):
+                Fraction of the rows every tree is fit on. Residuals are
+                still updated for all the rows. Defaults to 1.0.
+            goss_top_rate (float | None, optional):
+                With a value, rows are chosen by gradient-based one-side
+                sampling: this fraction of the rows with the largest
+                residuals is always kept and the rest of `subsample` is
+                drawn from the other rows and upweighted. Must be less
+                than `subsample`. Defaults to None (uniform sampling).
+            colsample_bytree (float, optional):
+                Fraction of the columns every tree is fit on.
+                Defaults to 1.0.
+            random_state (int | None, optional):
+                Seed of the row and column sampling and of the trees.
+                Every tree gets an independent random stream spawned
+                from it, so warm start continues the same sequence.
+                Defaults to None.
+            dtype (npt.DTypeLike, optional):
+                Floating type of the targets, residuals, running
+                predictions and stored leaf values, np.float64 or
+                np.float32. Features are converted once to float32 in
+                either case, since the trees compare them in float32.
+                Defaults to np.float64.
         """
+        if not 0 < subsample <= 1:
+            raise ValueError(f"subsample must be in (0, 1], got {subsample}")
+        if goss_top_rate is not None and not 0 < goss_top_rate < subsample:
+            raise ValueError(
+                f"goss_top_rate must be in (0, subsample={subsample}), "
+                f"got {goss_top_rate}"
+            )
+        if not 0 < colsample_bytree <= 1:
+            raise ValueError(
+                f"colsample_bytree must be in (0, 1], got {colsample_bytree}"
+            )
         self.n_estimators = n_estimators
         self.learning_rate = learning_rate
+        self.warm_start = warm_start
+        self.subsample = subsample
+        self.goss_top_rate = goss_top_rate
+        self.colsample_bytree = colsample_bytree
+        self.random_state = random_state
+        self.dtype = check_dtype(dtype)
+        self.seed_entropy: int | None = None
         if tree_params is None:
             tree_params = {}
+        self.tree_params = tree_params
+        self.best_iteration_: int | None = None
         self.forest = [
-            DecisionTreeRegressor(**tree_params) for _ in range(n_estimators)
+            make_tree(tree_params) for _ in range(n_estimators)
         ]
+        self._compiled: CompiledForest | None = None
 
     def fit(
         self,
@@ -51,6 +194,8 @@ class GradientBoostingMSE:
         y_val: npt.NDArray[np.float64] | None = None,
         trace: bool | None = None,
         patience: int | None = None,
+        callback: ProgressCallback | None = None,
+        convergence_history: ConvergenceHistory | None = None,
     ) -> ConvergenceHistory | None:
         """
         Trains an ensemble of trees on the provided data.
@@ -74,6 +219,14 @@ class GradientBoostingMSE:
                 Number of training steps without decreasing
                 the train loss (or validation if provided),
                 after which to stop training. Defaults to None.
+            callback (ProgressCallback | None, optional):
+                Function called after every fitted tree with the number
+                of trees, current losses (if traced) and elapsed time.
+                Defaults to None.
+            convergence_history (ConvergenceHistory | None, optional):
+                History of the already fitted trees. With `warm_start`
+                the losses of the new trees are appended to its copy
+                instead of being traced from scratch. Defaults to None.
 
         Returns:
             ConvergenceHistory | None: Instance of `ConvergenceHistory`
@@ -81,54 +234,255 @@ class GradientBoostingMSE:
         """
         from ensembles.utils import rmsle, whether_to_stop
 
+        start_time = time.perf_counter()
+
+        # Признаки приводятся к float32 один раз, а не в каждом дереве:
+        # обучающие - в порядке Fortran, удобном для поиска разбиений
+        X = check_features(X, order="F")
+        y = np.asarray(y, dtype=self.dtype)
+        if X_val is not None:
+            X_val = check_features(X_val)
+        if y_val is not None:
+            y_val = np.asarray(y_val, dtype=self.dtype)
+
+        # При дообучении уже обученные деревья остаются префиксом ансамбля
+        prefix = self._fitted_prefix() if self.warm_start else None
+        n_fitted = prefix.n_trees if prefix is not None else 0
+        if self.n_estimators < n_fitted:
+            raise ValueError(
+                f"n_estimators={self.n_estimators} must be at least the "
+                f"number of already fitted trees ({n_fitted}) to warm start"
+            )
+        if prefix is None or self.seed_entropy is None:
+            self.seed_entropy = int(
+                np.random.SeedSequence(self.random_state).entropy
+            )
+
         # Определяем, нужно ли отслеживать историю
         if trace is None:
             trace = X_val is not None and y_val is not None
 
-        convergence_history: ConvergenceHistory | None = None
-        if trace:
+        if not trace:
+            convergence_history = None
+        elif prefix is not None and convergence_history is not None:
+            convergence_history = {
+                "train": list(convergence_history["train"]),
+                "val": (
+                    list(convergence_history["val"])
+                    if convergence_history.get("val") is not None else None
+                ),
+            }
+        else:
             convergence_history = {
                 "train": [],
                 "val": [] if X_val is not None and y_val is not None else None,
             }
 
-        # Инициализация: начальное предсказание - среднее значение целевой переменной
-        self.const_prediction = float(np.mean(y))
-        current_prediction = np.full(X.shape[0], self.const_prediction)
+        if prefix is None:
+            # Инициализация: начальное предсказание - среднее значение целевой переменной
+            self.const_prediction = float(np.mean(y))
+            current_prediction = np.full(
+                X.shape[0], self.const_prediction, dtype=self.dtype
+            )
+            val_prediction = (
+                np.full(X_val.shape[0], self.const_prediction, dtype=self.dtype)
+                if X_val is not None else None
+            )
+        else:
+            # Продолжаем бустинг с предсказаний уже обученных деревьев:
+            # порядок суммирования тот же, что и при обучении за один раз
+            current_prediction = prefix.predict(
+                X, init=self.const_prediction, scale=self.learning_rate
+            ).astype(self.dtype, copy=False)
+            val_prediction = (
+                prefix.predict(
+                    X_val, init=self.const_prediction, scale=self.learning_rate
+                ).astype(self.dtype, copy=False)
+                if X_val is not None else None
+            )
+
+        new_trees = [
+            make_tree(self.tree_params)
+            for _ in range(n_fitted, self.n_estimators)
+        ]
+
+        # Столбцы, на которых обучено каждое дерево (None - все)
+        tree_columns: list[npt.NDArray[np.intp] | None] = []
+        n_objects, n_features = X.shape
+        sample_rows = self.subsample < 1
+        n_columns = max(1, int(self.colsample_bytree * n_features))
+
+        # Гистограммные деревья обучаются на признаках, квантованных
+        # один раз для всего ансамбля
+        X_fit, bin_mapper = bin_features(X, self.tree_params)
 
         # Обучаем деревья последовательно
-        for i, tree in enumerate(self.forest):
+        for j, tree in enumerate(new_trees):
+            i = n_fitted + j
             # Вычисляем антиградиент (для MSE это просто остатки: y - y_pred)
             residuals = y - current_prediction
 
-            # Обучаем дерево на антиградиенте
-            tree.fit(X, residuals)
+            # i-й поток случайности не зависит от того, обучалось ли
+            # начало ансамбля в том же вызове fit
+            rng = np.random.default_rng(
+                np.random.SeedSequence(self.seed_entropy, spawn_key=(i,))
+            )
+            rows, weights = (
+                _sample_rows(rng, residuals, self.subsample, self.goss_top_rate)
+                if sample_rows else (slice(None), None)
+            )
+            columns = (
+                np.sort(rng.choice(n_features, n_columns, replace=False))
+                if n_columns < n_features else None
+            )
+            tree.set_params(
+                random_state=int(rng.integers(np.iinfo(np.int32).max))
+            )
+
+            # Обучаем дерево на антиградиенте по выбранным строкам и столбцам
+            if columns is None:
+                X_tree = X_fit[rows] if sample_rows else X_fit
+            else:
+                X_tree = (
+                    X_fit[np.ix_(rows, columns)] if sample_rows
+                    else X_fit[:, columns]
+                )
+            fit_tree(
+                tree,
+                X=X_tree,
+                y=residuals[rows],
+                bin_mapper=(
+                    bin_mapper.take(columns)
+                    if bin_mapper is not None and columns is not None
+                    else bin_mapper
+                ),
+                sample_weight=weights,
+            )
+            tree_columns.append(columns)
 
-            # Обновляем предсказания
-            tree_predictions = tree.predict(X)
-            current_prediction += self.learning_rate * tree_predictions
+            # Обновляем предсказания всех объектов по значениям листьев
+            # нового дерева
+            current_prediction += self.learning_rate * _leaf_values(
+                tree, X, columns, self.dtype
+            )
+            train_loss = val_loss = None
 
             # Если нужна история сходимости
             if trace and convergence_history is not None:
-                # Предсказание текущего ансамбля
-                y_pred_train = self._predict_trees(X, i + 1)
-                train_loss = rmsle(y, y_pred_train)
+                # Предсказание текущего ансамбля уже накоплено
+                train_loss = rmsle(y, current_prediction)
                 convergence_history["train"].append(train_loss)
 
                 if X_val is not None and y_val is not None:
-                    y_pred_val = self._predict_trees(X_val, i + 1)
-                    val_loss = rmsle(y_val, y_pred_val)
+                    val_prediction += self.learning_rate * _leaf_values(
+                        tree, X_val, columns, self.dtype
+                    )
+                    val_loss = rmsle(y_val, val_prediction)
                     convergence_history["val"].append(val_loss)  # type: ignore
 
+            if callback is not None:
+                callback({
+                    "iteration": i + 1,
+                    "n_estimators": self.n_estimators,
+                    "train": train_loss,
+                    "val": val_loss,
+                    "oob": None,
+                    "elapsed": time.perf_counter() - start_time,
+                })
+
+            if trace and convergence_history is not None:
                 # Проверка early stopping
                 if patience is not None and whether_to_stop(convergence_history, patience):
                     # Обрезаем ансамбль до текущего размера
-                    self.forest = self.forest[:i + 1]
+                    new_trees = new_trees[:j + 1]
                     self.n_estimators = i + 1
                     break
 
+        self._set_trees(prefix, new_trees, tree_columns, n_features)
+
+        # Число деревьев с наименьшей ошибкой на валидации; при дообучении
+        # без прежней истории она известна не для всех деревьев
+        self.best_iteration_ = None
+        if (
+            convergence_history is not None
+            and convergence_history["val"]
+            and len(convergence_history["val"]) == self.n_estimators
+        ):
+            self.best_iteration_ = int(np.argmin(convergence_history["val"])) + 1
         return convergence_history
 
+    def _fitted_prefix(self) -> CompiledForest | None:
+        """
+        Returns the compiled trees fitted so far, if any.
+
+        Returns:
+            CompiledForest | None: Compiled fitted trees or None
+            if the ensemble has not been fitted yet.
+        """
+        if self._compiled is None and not (
+            self.forest and hasattr(self.forest[0], "tree_")
+        ):
+            return None
+        return self._compiled_forest()
+
+    def _set_trees(
+            self,
+            prefix: CompiledForest | None,
+            new_trees: list[TreeRegressor],
+            columns: list[npt.NDArray[np.intp] | None],
+            n_features: int
+    ) -> None:
+        """
+        Stores newly fitted trees after the already fitted ones.
+
+        Trees fit on column subsets are compiled right away, since
+        only the compiled forest maps their splits to the full
+        feature matrix.
+
+        Args:
+            prefix (CompiledForest | None): Compiled trees fitted
+                before, None when fitting from scratch.
+            new_trees (list[TreeRegressor]): Newly fitted trees.
+            columns (list[npt.NDArray[np.intp] | None]): Columns
+                every new tree was fit on, None for all the columns.
+            n_features (int): Number of features of the full matrix.
+        """
+        compiled = None
+        if any(tree_columns is not None for tree_columns in columns):
+            compiled = CompiledForest.from_trees(
+                new_trees,
+                columns=columns[:len(new_trees)],
+                n_features=n_features,
+                dtype=self.dtype
+            )
+        if prefix is None:
+            self.forest = new_trees
+            self._compiled = compiled
+            return
+
+        # У загруженных из упакованного формата моделей деревьев sklearn нет
+        self.forest = self.forest + new_trees if self.forest else []
+        self._compiled = prefix.concatenate(
+            compiled or CompiledForest.from_trees(new_trees, dtype=self.dtype)
+        )
+
+    def _compiled_forest(self) -> CompiledForest:
+        """
+        Returns the compiled inference representation of the ensemble.
+
+        It is built lazily from the fitted trees. Models loaded
+        from the packed format carry only this representation.
+
+        Returns:
+            CompiledForest: Packed arrays of all the trees.
+        """
+        if self._compiled is None:
+            self._compiled = CompiledForest.from_trees(
+                self.forest,
+                dtype=self.dtype
+            )
+        return self._compiled
+
     def _predict_trees(
             self,
             X: npt.NDArray[np.float64],
@@ -145,14 +499,17 @@ class GradientBoostingMSE:
         Returns:
             Предсказания
         """
-        prediction = np.full(X.shape[0], self.const_prediction)
-        for tree in self.forest[:n_trees]:
-            prediction += self.learning_rate * tree.predict(X)
-        return prediction
+        return self._compiled_forest().predict(
+            X=X,
+            n_trees=n_trees,
+            init=self.const_prediction,
+            scale=self.learning_rate
+        )
 
     def predict(
             self,
-            X: npt.NDArray[np.float64]
+            X: npt.NDArray[np.float64],
+            n_trees: int | None = None
     ) -> npt.NDArray[np.float64]:
         """
         Makes predictions with the ensemble of trees.
@@ -162,22 +519,53 @@ class GradientBoostingMSE:
         Args:
             X (npt.NDArray[np.float64]): Objects'
             features matrix, array of shape (n_objects, n_features).
+            n_trees (int | None, optional): Number of leading trees
+                to use, e.g. `best_iteration_` to serve a smaller and
+                faster ensemble. Defaults to None (all trees).
 
         Returns:
             npt.NDArray[np.float64]: Predicted values,
             array of shape (n_objects,).
         """
-        # Начинаем с константного предсказания
-        prediction = np.full(
-            shape=X.shape[0],
-            fill_value=self.const_prediction
-        )
+        if n_trees is None:
+            n_trees = self.n_estimators
+        if not 1 <= n_trees <= self.n_estimators:
+            raise ValueError(
+                f"n_trees must be between 1 and {self.n_estimators}, "
+                f"got {n_trees}"
+            )
+
+        # Константное предсказание плюс вклады деревьев с учетом learning_rate
+        return self._predict_trees(X, n_trees)
 
-        # Последовательно добавляем предсказания каждого дерева с учетом learning_rate
-        for tree in self.forest:
-            prediction += self.learning_rate * tree.predict(X)
+    def staged_predict(
+            self,
+            X: npt.NDArray[np.float64],
+            every: int = 1
+    ) -> Iterator[npt.NDArray[np.float64]]:
+        """
+        Makes predictions after each boosting step in one pass.
 
-        return prediction
+        Every tree is applied to `X` once, so evaluating all the
+        prefixes costs as much as a single `predict`.
+
+        Args:
+            X (npt.NDArray[np.float64]): Objects'
+            features matrix, array of shape (n_objects, n_features).
+            every (int, optional): Yield after every `every` trees
+                and after the last one. Defaults to 1.
+
+        Yields:
+            npt.NDArray[np.float64]: Predictions of the first
+            trees, array of shape (n_objects,).
+        """
+        for _, predictions in self._compiled_forest().staged_predict(
+            X=X,
+            init=self.const_prediction,
+            scale=self.learning_rate,
+            every=every
+        ):
+            yield predictions
 
     def dump(
             self,
@@ -186,6 +574,9 @@ class GradientBoostingMSE:
         """
         Saves the model to the specified directory.
 
+        All the trees are written into a single packed file
+        that `load` maps into memory.
+
         Args:
             dirpath (str): Path to the directory
             where the model will be saved.
@@ -197,17 +588,19 @@ class GradientBoostingMSE:
             "n_estimators": self.n_estimators,
             "learning_rate": self.learning_rate,
             "const_prediction": self.const_prediction,
+            "tree_params": self.tree_params,
+            "subsample": self.subsample,
+            "goss_top_rate": self.goss_top_rate,
+            "colsample_bytree": self.colsample_bytree,
+            "random_state": self.random_state,
+            "dtype": self.dtype.name,
+            "seed_entropy": self.seed_entropy,
+            "best_iteration": self.best_iteration_,
         }
         with (path / "params.json").open("w") as file:
             json.dump(params, file, indent=4)
 
-        trees_path = path / "trees"
-        trees_path.mkdir()
-        for i, tree in enumerate(self.forest):
-            joblib.dump(
-                value=tree,
-                filename=trees_path / f"tree_{i:04d}.joblib"
-            )
+        self._compiled_forest().save(path / FOREST_FILE)
 
     @classmethod
     def load(
@@ -217,6 +610,10 @@ class GradientBoostingMSE:
         """
         Loads the model from the specified directory.
 
+        Models in the packed format are memory-mapped and keep
+        only the compiled representation. Directories written
+        in the legacy per-tree joblib layout are still readable.
+
         Args:
             dirpath (str): Path to the directory
             where the model is saved.
@@ -229,8 +626,23 @@ class GradientBoostingMSE:
             params = json.load(file)
         instance = cls(
             n_estimators=params["n_estimators"],
-            learning_rate=params["learning_rate"]
+            tree_params=params.get("tree_params"),
+            learning_rate=params["learning_rate"],
+            subsample=params.get("subsample", 1.0),
+            goss_top_rate=params.get("goss_top_rate"),
+            colsample_bytree=params.get("colsample_bytree", 1.0),
+            random_state=params.get("random_state"),
+            dtype=params.get("dtype", "float64"),
         )
+        instance.const_prediction = params["const_prediction"]
+        instance.seed_entropy = params.get("seed_entropy")
+        instance.best_iteration_ = params.get("best_iteration")
+
+        forest_path = Path(dirpath) / FOREST_FILE
+        if forest_path.exists():
+            instance.forest = []
+            instance._compiled = CompiledForest.load(forest_path)
+            return instance
 
         trees_path = Path(dirpath) / "trees"
 
@@ -238,6 +650,5 @@ class GradientBoostingMSE:
             joblib.load(filename=trees_path / f"tree_{i:04d}.joblib")
             for i in range(params["n_estimators"])
         ]
-        instance.const_prediction = params["const_prediction"]
 
-        return instance
\ No newline at end of file
+        return instance
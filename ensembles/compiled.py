@@ -0,0 +1,519 @@
+import json
+from pathlib import Path
+from typing import Iterator, Sequence
+
+import numpy as np
+import numpy.typing as npt
+from sklearn.tree import DecisionTreeRegressor
+
+# Сколько пар (дерево, объект) обходится за один батч
+_BATCH_NODES = 1 << 18
+
+# Имя упакованного файла в директории модели
+FOREST_FILE = "forest.bin"
+
+# Формат файла: MAGIC, длина заголовка (uint64 LE), JSON-заголовок,
+# затем массивы узлов, каждый выровнен по _ALIGNMENT байт
+_MAGIC = b"ENSFRST1"
+_ALIGNMENT = 64
+_ARRAYS = (
+    "feature",
+    "threshold",
+    "children",
+    "missing_go_to_left",
+    "value",
+    "roots",
+    "depths",
+)
+
+
+class CompiledForest:
+    def __init__(
+        self,
+        feature: npt.NDArray[np.intp],
+        threshold: npt.NDArray[np.float64],
+        children: npt.NDArray[np.intp],
+        missing_go_to_left: npt.NDArray[np.bool_],
+        value: npt.NDArray[np.float64],
+        roots: npt.NDArray[np.intp],
+        depths: npt.NDArray[np.intp],
+        n_features: int,
+    ) -> None:
+        """
+        Array-backed inference representation of a fitted ensemble.
+
+        Nodes of all trees are packed into shared contiguous arrays
+        with global node indices. Leaves point to themselves, so
+        vectorized steps bring every object of every tree down to
+        its leaf, and pairs that stopped moving are dropped.
+
+        Args:
+            feature (npt.NDArray[np.intp]): Split feature of every node.
+            threshold (npt.NDArray[np.float64]): Split threshold of
+                every node.
+            children (npt.NDArray[np.intp]): Global indices of the
+                left and right children of every node interleaved,
+                array of shape (2 * n_nodes,). Leaves point to
+                themselves.
+            missing_go_to_left (npt.NDArray[np.bool_]): Whether NaN
+                values are sent to the left child.
+            value (npt.NDArray[np.float64]): Value of every node,
+                float64 or float32.
+            roots (npt.NDArray[np.intp]): Global index of each
+                tree's root, array of shape (n_trees,).
+            depths (npt.NDArray[np.intp]): Depth of each tree,
+                array of shape (n_trees,).
+            n_features (int): Number of features the trees were fit on.
+        """
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.missing_go_to_left = missing_go_to_left
+        self.value = value
+        self.roots = roots
+        self.depths = depths
+        self.n_features = n_features
+
+    @property
+    def n_trees(self) -> int:
+        """Number of trees in the compiled ensemble."""
+        return len(self.roots)
+
+    @classmethod
+    def from_trees(
+            cls,
+            trees: Sequence[DecisionTreeRegressor],
+            columns: Sequence[npt.NDArray[np.intp] | None] | None = None,
+            n_features: int | None = None,
+            dtype: npt.DTypeLike = np.float64
+    ) -> "CompiledForest":
+        """
+        Pack fitted sklearn trees into a single compiled forest.
+
+        Histogram trees expose the same `tree_` arrays and are
+        packed the same way.
+
+        Args:
+            trees (Sequence[DecisionTreeRegressor]): Fitted trees
+                sharing the same features.
+            columns (Sequence[npt.NDArray[np.intp] | None] | None,
+                optional): For every tree fit on a subset of the
+                columns, the indices of those columns, so that its
+                splits refer to the full feature matrix. None means
+                the tree was fit on all the columns. Defaults to None.
+            n_features (int | None, optional): Number of features of
+                the full matrix. Defaults to None (the number of
+                features of the first tree).
+            dtype (npt.DTypeLike, optional): Type of the stored leaf
+                values, which predictions are also reduced in.
+                Defaults to np.float64.
+
+        Returns:
+            CompiledForest: The compiled representation.
+        """
+        if columns is None:
+            columns = [None] * len(trees)
+        feature, threshold, children, missing, value = [], [], [], [], []
+        roots, depths = [], []
+        offset = 0
+        for tree, tree_columns in zip(trees, columns):
+            structure = tree.tree_
+            node_ids = np.arange(structure.node_count)
+            is_leaf = structure.children_left == -1
+            split_feature = np.where(is_leaf, 0, structure.feature)
+            if tree_columns is not None:
+                # Номера столбцов подмножества переводятся в номера признаков
+                split_feature = np.take(tree_columns, split_feature)
+
+            roots.append(offset)
+            depths.append(structure.max_depth)
+            feature.append(split_feature)
+            threshold.append(structure.threshold)
+            children.append(np.column_stack([
+                np.where(is_leaf, node_ids, structure.children_left),
+                np.where(is_leaf, node_ids, structure.children_right),
+            ]).ravel() + offset)
+            missing.append(structure.missing_go_to_left.astype(np.bool_))
+            value.append(structure.value[:, 0, 0])
+            offset += structure.node_count
+
+        return cls(
+            feature=np.concatenate(feature or [[]]).astype(np.intp),
+            threshold=np.concatenate(threshold or [[]]).astype(np.float64),
+            children=np.concatenate(children or [[]]).astype(np.intp),
+            missing_go_to_left=np.concatenate(missing or [[]]).astype(np.bool_),
+            value=np.concatenate(value or [[]]).astype(dtype),
+            roots=np.array(roots, dtype=np.intp),
+            depths=np.array(depths, dtype=np.intp),
+            n_features=(
+                n_features if n_features is not None
+                else trees[0].n_features_in_ if trees else 0
+            ),
+        )
+
+    def head(
+            self,
+            n_trees: int
+    ) -> "CompiledForest":
+        """
+        Take the leading trees of the forest.
+
+        Trees are stored one after another, so the result is a set
+        of views into the arrays of this forest.
+
+        Args:
+            n_trees (int): Number of leading trees to keep.
+
+        Returns:
+            CompiledForest: Forest of the first `n_trees` trees.
+        """
+        n_nodes = (
+            int(self.roots[n_trees]) if n_trees < self.n_trees
+            else len(self.value)
+        )
+        return CompiledForest(
+            feature=self.feature[:n_nodes],
+            threshold=self.threshold[:n_nodes],
+            children=self.children[:2 * n_nodes],
+            missing_go_to_left=self.missing_go_to_left[:n_nodes],
+            value=self.value[:n_nodes],
+            roots=self.roots[:n_trees],
+            depths=self.depths[:n_trees],
+            n_features=self.n_features,
+        )
+
+    def concatenate(
+            self,
+            other: "CompiledForest"
+    ) -> "CompiledForest":
+        """
+        Append the trees of another forest after the trees of this one.
+
+        Args:
+            other (CompiledForest): Forest over the same features.
+
+        Returns:
+            CompiledForest: Forest holding the trees of both.
+        """
+        if other.n_trees == 0:
+            return self
+        if self.n_trees == 0:
+            return other
+        if other.n_features != self.n_features:
+            raise ValueError(
+                f"Cannot concatenate forests over {self.n_features} "
+                f"and {other.n_features} features."
+            )
+
+        # Глобальные индексы узлов второго леса сдвигаются на размер первого
+        offset = len(self.value)
+        return CompiledForest(
+            feature=np.concatenate([self.feature, other.feature]),
+            threshold=np.concatenate([self.threshold, other.threshold]),
+            children=np.concatenate([self.children, other.children + offset]),
+            missing_go_to_left=np.concatenate([
+                self.missing_go_to_left,
+                other.missing_go_to_left,
+            ]),
+            value=np.concatenate([self.value, other.value]),
+            roots=np.concatenate([self.roots, other.roots + offset]),
+            depths=np.concatenate([self.depths, other.depths]),
+            n_features=self.n_features,
+        )
+
+    def apply(
+            self,
+            X: npt.NDArray[np.float32],
+            n_trees: int
+    ) -> npt.NDArray[np.intp]:
+        """
+        Find the leaves the objects fall into in the first `n_trees` trees.
+
+        Args:
+            X (npt.NDArray[np.float32]): C-contiguous float32 features
+                matrix, array of shape (n_objects, n_features).
+            n_trees (int): Number of leading trees to use.
+
+        Returns:
+            npt.NDArray[np.intp]: Global leaf indices, array of shape
+                (n_trees, n_objects).
+        """
+        n_objects = X.shape[0]
+        flat = X.ravel()
+        current = np.repeat(self.roots[:n_trees], n_objects)
+        offsets = np.tile(np.arange(n_objects) * X.shape[1], n_trees)
+        has_nan = bool(np.isnan(flat).any())
+
+        # Шагают только пары (дерево, объект), ещё не дошедшие до листа,
+        # поэтому работа следует длинам путей, а не глубине самого глубокого
+        # дерева. Лист указывает сам на себя: пара, не сдвинувшаяся за шаг,
+        # дошла до листа. Пока пары не отбрасывались, active равен None
+        nodes, active = current, None
+        for level in range(int(self.depths[:n_trees].max(initial=0))):
+            x = np.take(flat, offsets + np.take(self.feature, current))
+            go_right = x > np.take(self.threshold, current)
+            if has_nan:
+                is_nan = np.isnan(x)
+                go_right[is_nan] = ~np.take(self.missing_go_to_left, current[is_nan])
+            # Потомки узла i лежат в children[2 * i] и children[2 * i + 1]
+            step = np.take(self.children, 2 * current + go_right)
+            at_leaf = step == current if level % 2 else None
+            current = step
+
+            # Проверка и сжатие стоят лишних проходов, поэтому листья ищутся
+            # через уровень, а сжимают, когда до них дошла заметная часть пар
+            if at_leaf is None:
+                continue
+            n_done = np.count_nonzero(at_leaf)
+            if n_done == len(current):
+                break
+            if 2 * n_done >= len(current):
+                walking = np.flatnonzero(~at_leaf)
+                if active is None:
+                    nodes, active = current, walking
+                else:
+                    nodes[active[at_leaf]] = current[at_leaf]
+                    active = np.take(active, walking)
+                current = np.take(current, walking)
+                offsets = np.take(offsets, walking)
+
+        if active is None:
+            nodes = current
+        else:
+            nodes[active] = current
+        return nodes.reshape(n_trees, n_objects)
+
+    def predict(
+            self,
+            X: npt.NDArray[np.float64],
+            n_trees: int | None = None,
+            init: float = 0.0,
+            scale: float = 1.0
+    ) -> npt.NDArray[np.float64]:
+        """
+        Reduce predictions of the leading trees into one vector.
+
+        Computes `init + scale * p_1 + ... + scale * p_n` summed in
+        tree order, which matches sequential per-tree accumulation
+        exactly. Objects are processed in batches, so the temporary
+        (n_trees, batch) arrays stay bounded in size.
+
+        Args:
+            X (npt.NDArray[np.float64]): Objects features matrix,
+                array of shape (n_objects, n_features).
+            n_trees (int | None, optional): Number of leading trees
+                to use. Defaults to None (all trees).
+            init (float, optional): Initial value of the sum.
+                Defaults to 0.0.
+            scale (float, optional): Weight of every tree.
+                Defaults to 1.0.
+
+        Returns:
+            npt.NDArray[np.float64]: Reduced predictions of the type
+                of the leaf values, array of shape (n_objects,).
+        """
+        X = np.asarray(X)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(
+                f"X has {X.shape[-1]} features, but the forest "
+                f"is expecting {self.n_features} features as input."
+            )
+        if n_trees is None:
+            n_trees = self.n_trees
+
+        n_objects = X.shape[0]
+        batch_size = max(1, _BATCH_NODES // max(n_trees, 1))
+        result = np.empty(n_objects, dtype=self.value.dtype)
+
+        for start in range(0, n_objects, batch_size):
+            # Деревья sklearn сравнивают признаки во float32
+            batch = np.ascontiguousarray(
+                X[start:start + batch_size],
+                dtype=np.float32
+            )
+            leaves = self.apply(batch, n_trees)
+
+            terms = np.empty((n_trees + 1, batch.shape[0]), dtype=self.value.dtype)
+            terms[0] = init
+            np.take(self.value, leaves, out=terms[1:])
+            if scale != 1.0:
+                terms[1:] *= scale
+            result[start:start + batch.shape[0]] = terms.sum(axis=0)
+
+        return result
+
+    def tree_predictions(
+            self,
+            X: npt.NDArray[np.float64]
+    ) -> Iterator[npt.NDArray[np.float64]]:
+        """
+        Predict with every tree separately, in tree order.
+
+        Trees are applied in chunks, so only a bounded number of
+        per-tree prediction vectors is kept in memory at once.
+
+        Args:
+            X (npt.NDArray[np.float64]): Objects features matrix,
+                array of shape (n_objects, n_features).
+
+        Yields:
+            npt.NDArray[np.float64]: Predictions of the next tree,
+                array of shape (n_objects,).
+        """
+        X = np.asarray(X)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(
+                f"X has {X.shape[-1]} features, but the forest "
+                f"is expecting {self.n_features} features as input."
+            )
+
+        # Деревья sklearn сравнивают признаки во float32
+        X32 = np.ascontiguousarray(X, dtype=np.float32)
+        chunk_size = max(1, _BATCH_NODES // max(X.shape[0], 1))
+
+        for start in range(0, self.n_trees, chunk_size):
+            stop = min(start + chunk_size, self.n_trees)
+            # Узлы общие, поэтому достаточно взять нужный срез корней
+            chunk = CompiledForest(
+                feature=self.feature,
+                threshold=self.threshold,
+                children=self.children,
+                missing_go_to_left=self.missing_go_to_left,
+                value=self.value,
+                roots=self.roots[start:stop],
+                depths=self.depths[start:stop],
+                n_features=self.n_features,
+            )
+            yield from np.take(self.value, chunk.apply(X32, chunk.n_trees))
+
+    def staged_predict(
+            self,
+            X: npt.NDArray[np.float64],
+            init: float = 0.0,
+            scale: float = 1.0,
+            every: int = 1
+    ) -> Iterator[tuple[int, npt.NDArray[np.float64]]]:
+        """
+        Reduce predictions of growing tree prefixes in one pass.
+
+        Every tree is applied once and added to a running sum, so
+        the total cost is that of a single `predict`, and each
+        yielded vector equals `predict(X, n_trees, init, scale)`
+        exactly.
+
+        Args:
+            X (npt.NDArray[np.float64]): Objects features matrix,
+                array of shape (n_objects, n_features).
+            init (float, optional): Initial value of the sum.
+                Defaults to 0.0.
+            scale (float, optional): Weight of every tree.
+                Defaults to 1.0.
+            every (int, optional): Yield after every `every` trees
+                and after the last one. Defaults to 1.
+
+        Yields:
+            tuple[int, npt.NDArray[np.float64]]: Number of trees and
+                the reduced predictions of that prefix, array of
+                shape (n_objects,).
+        """
+        if every < 1:
+            raise ValueError(f"every must be positive, got {every}")
+
+        running = np.full(np.shape(X)[0], init, dtype=self.value.dtype)
+        for i, term in enumerate(self.tree_predictions(X), start=1):
+            if scale != 1.0:
+                term = term * scale
+            running += term
+            if i % every == 0 or i == self.n_trees:
+                yield i, running.copy()
+
+    def save(
+            self,
+            path: str | Path
+    ) -> None:
+        """
+        Write the compiled forest into a single packed file.
+
+        The file holds a small JSON header followed by the node
+        arrays stored contiguously in little-endian byte order.
+        Every array keeps its type, which the header records.
+
+        Args:
+            path (str | Path): Path of the file to write.
+        """
+        arrays = {
+            name: np.ascontiguousarray(
+                getattr(self, name),
+                dtype=getattr(self, name).dtype.newbyteorder("<")
+            )
+            for name in _ARRAYS
+        }
+
+        layout = {}
+        offset = 0
+        for name, array in arrays.items():
+            layout[name] = {
+                "dtype": array.dtype.str,
+                "shape": list(array.shape),
+                "offset": offset,
+            }
+            offset = _align(offset + array.nbytes)
+        header = json.dumps({
+            "n_features": self.n_features,
+            "arrays": layout,
+        }).encode()
+
+        # Данные начинаются с выровненной позиции после заголовка
+        data_start = _align(len(_MAGIC) + 8 + len(header))
+        header = header.ljust(data_start - len(_MAGIC) - 8)
+
+        with Path(path).open("wb") as file:
+            file.write(_MAGIC)
+            file.write(len(header).to_bytes(8, "little"))
+            file.write(header)
+            for name, array in arrays.items():
+                file.seek(data_start + layout[name]["offset"])
+                file.write(array.tobytes())
+
+    @classmethod
+    def load(
+            cls,
+            path: str | Path
+    ) -> "CompiledForest":
+        """
+        Open a packed forest file without copying it into memory.
+
+        The whole file is mapped with `np.memmap` once and the node
+        arrays are read-only views into it, so loading costs O(1) and
+        processes opening the same model share the page cache.
+
+        Args:
+            path (str | Path): Path of the file written by `save`.
+
+        Returns:
+            CompiledForest: Forest backed by the mapped file.
+        """
+        buffer = np.memmap(path, dtype=np.uint8, mode="r")
+        if bytes(buffer[:len(_MAGIC)]) != _MAGIC:
+            raise ValueError(f"{path} is not a packed forest file")
+
+        header_start = len(_MAGIC) + 8
+        header_length = int.from_bytes(buffer[len(_MAGIC):header_start], "little")
+        header = json.loads(bytes(buffer[header_start:header_start + header_length]))
+        data_start = header_start + header_length
+
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            arrays[name] = np.ndarray(
+                shape=tuple(spec["shape"]),
+                dtype=np.dtype(spec["dtype"]),
+                buffer=buffer,
+                offset=data_start + spec["offset"]
+            )
+
+        return cls(n_features=header["n_features"], **arrays)
+
+
+def _align(offset: int) -> int:
+    """Round `offset` up to the packed file alignment."""
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
@@ -3,8 +3,12 @@
 This module provides Client class and plot_learning_curves function
 for communication with the backend API.
 """
-from typing import Any
+import io
+import json
+import time
+from typing import Any, Iterator, Literal
 
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import requests
@@ -15,12 +19,25 @@ from ensembles.backend import ExperimentConfig
 class ConvergenceHistoryResponse:
     """Response with convergence history."""
 
-    def __init__(self, train: list[float], val: list[float] | None = None):
+    def __init__(
+        self,
+        train: list[float],
+        val: list[float] | None = None,
+        best_iteration: int | None = None,
+        oob: list[float] | None = None,
+    ):
         self.train = train
         self.val = val
+        self.oob = oob
+        self.best_iteration = best_iteration
 
     def model_dump(self) -> dict:
-        return {"train": self.train, "val": self.val}
+        return {
+            "train": self.train,
+            "val": self.val,
+            "oob": self.oob,
+            "best_iteration": self.best_iteration,
+        }
 
 
 class Client:
@@ -31,9 +48,15 @@ class Client:
         self.base_url = base_url.rstrip("/")
         self.session = requests.Session()
 
-    def get_names(self) -> list[str]:
-        """Get list of existing experiment names."""
-        response = self.session.get(f"{self.base_url}/existing_experiments/")
+    def get_names(self, offset: int = 0, limit: int | None = None) -> list[str]:
+        """Get list of existing experiment names, optionally a single page."""
+        params = {"offset": offset}
+        if limit is not None:
+            params["limit"] = limit
+        response = self.session.get(
+            f"{self.base_url}/existing_experiments/",
+            params=params,
+        )
         response.raise_for_status()
         return response.json()["experiment_names"]
 
@@ -43,8 +66,6 @@ class Client:
         train_file: Any
     ) -> None:
         """Register a new experiment with configuration and training data."""
-        import json
-
         train_file.seek(0)
 
         files = {"train_file": (train_file.name, train_file, "text/csv")}
@@ -75,13 +96,72 @@ class Client:
         response.raise_for_status()
         return response.json()["response"]
 
-    def train_model(self, experiment_name: str) -> None:
-        """Train model for the specified experiment."""
+    def train_model(
+        self,
+        experiment_name: str,
+        poll_interval: float = 1.0
+    ) -> dict:
+        """Train model for the specified experiment and wait for the job."""
+        job = self.start_training(experiment_name)
+        return self.wait_for_job(job, poll_interval)
+
+    def continue_training(
+        self,
+        experiment_name: str,
+        extra_trees: int,
+        poll_interval: float = 1.0
+    ) -> dict:
+        """Grow the trained model by `extra_trees` trees and wait for the job."""
+        response = self.session.post(
+            f"{self.base_url}/continue_training/",
+            params={"experiment_name": experiment_name, "extra_trees": extra_trees},
+        )
+        response.raise_for_status()
+        return self.wait_for_job(response.json(), poll_interval)
+
+    def wait_for_job(self, job: dict, poll_interval: float = 1.0) -> dict:
+        """Poll a training job until it finishes, raising if it failed."""
+        while job["status"] in ("queued", "running"):
+            time.sleep(poll_interval)
+            job = self.get_train_status(job["job_id"])
+
+        if job["status"] == "failed":
+            raise RuntimeError(f"Training failed: {job['error']}")
+        return job
+
+    def start_training(self, experiment_name: str) -> dict:
+        """Enqueue training for the specified experiment."""
         response = self.session.post(
             f"{self.base_url}/train/",
             params={"experiment_name": experiment_name},
         )
         response.raise_for_status()
+        return response.json()
+
+    def get_train_status(self, job_id: str) -> dict:
+        """Get status and progress of a training job."""
+        response = self.session.get(
+            f"{self.base_url}/train_status/",
+            params={"job_id": job_id},
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def stream_train_progress(self, experiment_name: str) -> Iterator[dict]:
+        """Read per-tree training progress as it is streamed back.
+
+        Yields progress records with `iteration`, `n_estimators`, `train`,
+        `val`, `oob` and `elapsed` keys, and a final record with a `status` key.
+        """
+        with self.session.get(
+            f"{self.base_url}/train_progress/",
+            params={"experiment_name": experiment_name},
+            stream=True,
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("data:"):
+                    yield json.loads(line[len("data:"):])
 
     def get_convergence_history(
         self,
@@ -97,38 +177,135 @@ class Client:
         return ConvergenceHistoryResponse(
             train=data["train"],
             val=data.get("val"),
+            best_iteration=data.get("best_iteration"),
+            oob=data.get("oob"),
         )
 
-    def predict(self, experiment_name: str, test_file: Any) -> list[float]:
-        """Make predictions using trained model."""
+    def predict(
+        self,
+        experiment_name: str,
+        test_file: Any,
+        binary: Literal["npy", "float32", "float64"] | None = None,
+        n_trees: int | None = None,
+    ) -> list[float] | np.ndarray:
+        """Make predictions using trained model.
+
+        With `binary` set, predictions are transferred as a `.npy` file or
+        raw little-endian floats and decoded into a NumPy array. `n_trees`
+        limits prediction to the leading trees of the model.
+        """
         test_file.seek(0)
 
         files = {"test_file": (test_file.name, test_file, "text/csv")}
+        if binary == "npy":
+            accept = "application/x-npy"
+        elif binary is not None:
+            accept = f"application/octet-stream; dtype={binary}"
+        else:
+            accept = "application/json"
+
+        params = {"experiment_name": experiment_name}
+        if n_trees is not None:
+            params["n_trees"] = n_trees
 
         response = self.session.post(
             f"{self.base_url}/predict/",
-            params={"experiment_name": experiment_name},
+            params=params,
             files=files,
+            headers={"Accept": accept},
+        )
+        response.raise_for_status()
+
+        if binary == "npy":
+            return np.load(io.BytesIO(response.content))
+        if binary is not None:
+            return np.frombuffer(
+                response.content,
+                dtype="<f4" if binary == "float32" else "<f8",
+            )
+        return response.json()["predictions"]
+
+    def predict_rows(
+        self,
+        experiment_name: str,
+        rows: pd.DataFrame | list[dict[str, float]] | dict[str, list[float]],
+        n_trees: int | None = None,
+    ) -> list[float]:
+        """Make predictions for a few feature rows sent as JSON.
+
+        Rows are given as a DataFrame, a list of records or a columnar dict
+        keyed by column names; missing values are sent as nulls.
+        """
+        if isinstance(rows, pd.DataFrame):
+            rows = rows.astype(object).where(rows.notna(), None).to_dict(
+                orient="list"
+            )
+
+        params = {"experiment_name": experiment_name}
+        if n_trees is not None:
+            params["n_trees"] = n_trees
+
+        response = self.session.post(
+            f"{self.base_url}/predict_rows/",
+            params=params,
+            json=rows,
         )
         response.raise_for_status()
         return response.json()["predictions"]
 
+    def predict_stream(
+        self,
+        experiment_name: str,
+        test_file: Any,
+        n_trees: int | None = None,
+    ) -> Iterator[float]:
+        """Make predictions, reading them as they are streamed back."""
+        test_file.seek(0)
+
+        files = {"test_file": (test_file.name, test_file, "text/csv")}
+        params = {"experiment_name": experiment_name, "fmt": "ndjson"}
+        if n_trees is not None:
+            params["n_trees"] = n_trees
+
+        with self.session.post(
+            f"{self.base_url}/predict_stream/",
+            params=params,
+            files=files,
+            stream=True,
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    yield float(line)
+
 
 def plot_learning_curves(convergence_history: ConvergenceHistoryResponse):
     """Plot learning curves using plotly."""
-    data = convergence_history.model_dump()
-    df = pd.DataFrame(data)
+    curves = {"train": convergence_history.train}
+    # Кривые, которые не считались (все значения пустые), не рисуются
+    for name, losses in [
+        ("val", convergence_history.val),
+        ("oob", convergence_history.oob),
+    ]:
+        if losses and any(loss is not None for loss in losses):
+            curves[name] = losses
+
+    df = pd.DataFrame(curves)
     df_melted = df.reset_index().melt(
         id_vars=["index"],
-        value_vars=["train", "val"],
+        value_vars=list(curves),
         var_name="Dataset",
         value_name="RMSLE",
     )
 
     train_loss = min(convergence_history.train)
-    val_loss = min(convergence_history.val) if convergence_history.val else 0
+    # Без отложенной выборки валидацией служит out-of-bag кривая
+    val_curve = curves.get("val", curves.get("oob"))
+    val_loss = (
+        min(loss for loss in val_curve if loss is not None) if val_curve else 0
+    )
 
-    return px.line(
+    fig = px.line(
         df_melted,
         x="index",
         y="RMSLE",
@@ -136,3 +313,10 @@ def plot_learning_curves(convergence_history: ConvergenceHistoryResponse):
         labels={"index": "Iterations", "RMSLE": "RMSLE"},
         title=f"RMSLE: train [{train_loss:.4f}] | validation [{val_loss:.4f}]",
     )
+    if convergence_history.best_iteration is not None:
+        fig.add_vline(
+            x=convergence_history.best_iteration - 1,
+            line_dash="dash",
+            annotation_text=f"best: {convergence_history.best_iteration} trees",
+        )
+    return fig
@@ -0,0 +1,1179 @@
+from typing import Any, Union
+
+import numpy as np
+import numpy.typing as npt
+from sklearn.base import BaseEstimator, RegressorMixin
+from sklearn.tree import DecisionTreeRegressor
+
+# Наибольшее число корзин: вместе с корзиной пропусков коды помещаются в uint8
+MAX_BINS = 255
+
+# По скольким объектам ищутся границы корзин
+_BINNING_SUBSAMPLE = 200_000
+
+# Сколько значений гистограмм одного уровня дерева держится в памяти
+_MAX_HIST_VALUES = 1 << 18
+
+# Выигрыш разбиения должен превышать ошибку округления его слагаемых
+_GAIN_RTOL = 1e-12
+
+# Обозначения листьев как в деревьях sklearn
+_TREE_LEAF = -1
+_TREE_UNDEFINED = -2
+
+
+class BinMapper:
+    def __init__(
+        self,
+        max_bins: int = MAX_BINS,
+        subsample: int | None = _BINNING_SUBSAMPLE,
+        random_state: int | None = 0,
+    ) -> None:
+        """
+        Quantizer of features into a small number of ordered bins.
+
+        Bin edges are midpoints between neighbouring distinct values
+        or, for features with more distinct values than bins, between
+        quantiles. Objects with `x <= edges[b]` fall into bins up to
+        `b`, so a split on bin `b` is the ordinary tree split on the
+        threshold `edges[b]`. Missing values get a separate bin with
+        the code `n_bins_[f]`.
+
+        Args:
+            max_bins (int, optional): Maximum number of bins of
+                non-missing values per feature, at most 255.
+                Defaults to 255.
+            subsample (int | None, optional): Number of objects
+                used to find the bin edges. Defaults to 200000,
+                None means all objects.
+            random_state (int | None, optional): Seed of the
+                subsample. Defaults to 0.
+        """
+        if not 2 <= max_bins <= MAX_BINS:
+            raise ValueError(
+                f"max_bins must be between 2 and {MAX_BINS}, got {max_bins}"
+            )
+        self.max_bins = max_bins
+        self.subsample = subsample
+        self.random_state = random_state
+
+    def fit(
+            self,
+            X: npt.NDArray[np.float64]
+    ) -> "BinMapper":
+        """
+        Find the bin edges of every feature.
+
+        Values are compared in float32, as in sklearn trees,
+        so the edges are consistent with tree inference.
+
+        Args:
+            X (npt.NDArray[np.float64]): Objects features matrix,
+                array of shape (n_objects, n_features).
+
+        Returns:
+            BinMapper: The fitted mapper.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        if self.subsample is not None and X.shape[0] > self.subsample:
+            rng = np.random.default_rng(self.random_state)
+            X = X[rng.choice(X.shape[0], self.subsample, replace=False)]
+
+        self.bin_thresholds_ = []
+        for column in X.T:
+            column = column[~np.isnan(column)]
+            distinct = np.unique(column).astype(np.float64)
+            if len(distinct) <= self.max_bins:
+                edges = (distinct[:-1] + distinct[1:]) / 2
+            else:
+                quantiles = np.linspace(0, 100, self.max_bins + 1)[1:-1]
+                edges = np.unique(
+                    np.percentile(column, quantiles, method="midpoint")
+                )
+            self.bin_thresholds_.append(edges)
+
+        self.n_bins_ = np.array(
+            [len(edges) + 1 for edges in self.bin_thresholds_],
+            dtype=np.intp
+        )
+        self.n_features_in_ = X.shape[1]
+        return self
+
+    def transform(
+            self,
+            X: npt.NDArray[np.float64]
+    ) -> npt.NDArray[np.uint8]:
+        """
+        Replace feature values with their bin codes.
+
+        Args:
+            X (npt.NDArray[np.float64]): Objects features matrix,
+                array of shape (n_objects, n_features).
+
+        Returns:
+            npt.NDArray[np.uint8]: C-contiguous bin codes, array
+                of shape (n_objects, n_features).
+        """
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f"X has {X.shape[-1]} features, but BinMapper "
+                f"is expecting {self.n_features_in_} features as input."
+            )
+
+        binned = np.empty(X.shape, dtype=np.uint8)
+        for f, edges in enumerate(self.bin_thresholds_):
+            column = X[:, f]
+            codes = np.searchsorted(edges, column, side="left")
+            codes[np.isnan(column)] = self.n_bins_[f]
+            binned[:, f] = codes
+        return binned
+
+    def fit_transform(
+            self,
+            X: npt.NDArray[np.float64]
+    ) -> npt.NDArray[np.uint8]:
+        """
+        Find the bin edges and replace feature values with bin codes.
+
+        Args:
+            X (npt.NDArray[np.float64]): Objects features matrix,
+                array of shape (n_objects, n_features).
+
+        Returns:
+            npt.NDArray[np.uint8]: C-contiguous bin codes, array
+                of shape (n_objects, n_features).
+        """
+        return self.fit(X).transform(X)
+
+    def take(
+            self,
+            features: npt.NDArray[np.intp]
+    ) -> "BinMapper":
+        """
+        Get the fitted mapper of a subset of the features.
+
+        Trees fit on a subset of the binned columns use it to turn
+        their bin splits into thresholds.
+
+        Args:
+            features (npt.NDArray[np.intp]): Indices of the features
+                to keep, in the order of the columns of the subset.
+
+        Returns:
+            BinMapper: Mapper of the selected features.
+        """
+        mapper = BinMapper(
+            max_bins=self.max_bins,
+            subsample=self.subsample,
+            random_state=self.random_state,
+        )
+        mapper.bin_thresholds_ = [self.bin_thresholds_[f] for f in features]
+        mapper.n_bins_ = self.n_bins_[features]
+        mapper.n_features_in_ = len(features)
+        return mapper
+
+
+class _TreeStructure:
+    """Node arrays of a fitted histogram tree laid out like sklearn's `tree_`."""
+
+    def __init__(
+        self,
+        children_left: npt.NDArray[np.intp],
+        children_right: npt.NDArray[np.intp],
+        feature: npt.NDArray[np.intp],
+        threshold: npt.NDArray[np.float64],
+        missing_go_to_left: npt.NDArray[np.uint8],
+        value: npt.NDArray[np.float64],
+        n_node_samples: npt.NDArray[np.intp],
+        weighted_n_node_samples: npt.NDArray[np.float64],
+        max_depth: int,
+    ) -> None:
+        self.children_left = children_left
+        self.children_right = children_right
+        self.feature = feature
+        self.threshold = threshold
+        self.missing_go_to_left = missing_go_to_left
+        self.value = value
+        self.n_node_samples = n_node_samples
+        self.weighted_n_node_samples = weighted_n_node_samples
+        self.max_depth = max_depth
+
+    @property
+    def node_count(self) -> int:
+        """Number of nodes in the tree."""
+        return len(self.feature)
+
+
+class HistogramTreeRegressor(BaseEstimator, RegressorMixin):
+    def __init__(
+        self,
+        max_depth: int | None = None,
+        min_samples_split: int = 2,
+        min_samples_leaf: int = 1,
+        max_features: int | float | str | None = None,
+        max_bins: int = MAX_BINS,
+        random_state: int | None = None,
+    ) -> None:
+        """
+        Regression tree grown on histograms of binned features.
+
+        Instead of sorting feature values at every node, objects are
+        quantized into at most `max_bins` bins and every candidate
+        split of a node is scored from per-bin sums of the targets.
+        The tree grows level by level: histograms of a whole level
+        are built with a single pass over its objects, and the larger
+        child of every split gets its histogram as the parent's minus
+        the smaller sibling's. The fitted tree exposes a `tree_`
+        compatible with sklearn's, so it is compiled and predicted
+        the same way.
+
+        Args:
+            max_depth (int | None, optional): Maximum depth of the
+                tree. Defaults to None (grow until leaves are pure
+                or too small).
+            min_samples_split (int, optional): Minimum number of
+                objects to split a node. Defaults to 2.
+            min_samples_leaf (int, optional): Minimum number of
+                objects in a leaf. Defaults to 1.
+            max_features (int | float | str | None, optional):
+                Number of features considered at every node, as in
+                sklearn: an int, a fraction, 'sqrt' or 'log2'.
+                Defaults to None (all features).
+            max_bins (int, optional): Maximum number of bins per
+                feature when `fit` quantizes the data itself, at
+                most 255. Defaults to 255.
+            random_state (int | None, optional): Seed of the
+                feature sampling. Defaults to None.
+        """
+        self.max_depth = max_depth
+        self.min_samples_split = min_samples_split
+        self.min_samples_leaf = min_samples_leaf
+        self.max_features = max_features
+        self.max_bins = max_bins
+        self.random_state = random_state
+
+    def fit(
+            self,
+            X: npt.NDArray[np.float64],
+            y: npt.NDArray[np.float64],
+            sample_weight: npt.NDArray[np.float64] | None = None
+    ) -> "HistogramTreeRegressor":
+        """
+        Quantize the features and grow the tree on them.
+
+        Args:
+            X (npt.NDArray[np.float64]): Objects features matrix,
+                array of shape (n_objects, n_features).
+            y (npt.NDArray[np.float64]): Regression labels,
+                array of shape (n_objects,).
+            sample_weight (npt.NDArray[np.float64] | None, optional):
+                Weights of the objects. Defaults to None.
+
+        Returns:
+            HistogramTreeRegressor: The fitted tree.
+        """
+        bin_mapper = BinMapper(max_bins=self.max_bins).fit(X)
+        return self.fit_binned(
+            bin_mapper.transform(X), y, bin_mapper, sample_weight
+        )
+
+    def fit_binned(
+            self,
+            X_binned: npt.NDArray[np.uint8],
+            y: npt.NDArray[np.float64],
+            bin_mapper: BinMapper,
+            sample_weight: npt.NDArray[np.float64] | None = None
+    ) -> "HistogramTreeRegressor":
+        """
+        Grow the tree on features already quantized by `bin_mapper`.
+
+        Ensembles quantize their training data once and fit all
+        the trees on the same codes.
+
+        Args:
+            X_binned (npt.NDArray[np.uint8]): Bin codes, array of
+                shape (n_objects, n_features).
+            y (npt.NDArray[np.float64]): Regression labels,
+                array of shape (n_objects,).
+            bin_mapper (BinMapper): Mapper that produced the codes.
+            sample_weight (npt.NDArray[np.float64] | None, optional):
+                Weights of the objects. Defaults to None.
+
+        Returns:
+            HistogramTreeRegressor: The fitted tree.
+        """
+        X_binned = np.ascontiguousarray(X_binned, dtype=np.uint8)
+        y = np.asarray(y, dtype=np.float64)
+        n_objects, n_features = X_binned.shape
+        if n_objects == 0:
+            raise ValueError("Cannot fit a tree on an empty dataset")
+        if n_features != bin_mapper.n_features_in_:
+            raise ValueError(
+                f"X_binned has {n_features} features, but the bin mapper "
+                f"was fitted on {bin_mapper.n_features_in_} features."
+            )
+
+        if sample_weight is not None:
+            sample_weight = np.asarray(sample_weight, dtype=np.float64)
+            targets = y * sample_weight
+            total_weight = float(sample_weight.sum())
+        else:
+            targets = y
+            total_weight = float(n_objects)
+
+        finder = _SplitFinder(
+            X_binned, targets, sample_weight, bin_mapper, self.min_samples_leaf
+        )
+        n_cells = finder.n_cells
+        max_depth = np.inf if self.max_depth is None else self.max_depth
+        n_split_features = _n_split_features(self.max_features, n_features)
+        rng = np.random.default_rng(self.random_state)
+
+        # Узлы нумеруются по уровням, так что узлы одного уровня занимают
+        # отрезок номеров и их массивы дописываются целиком
+        nodes: dict[str, list[np.ndarray]] = {
+            name: [] for name in (
+                "children_left", "children_right", "feature", "threshold",
+                "missing_go_to_left", "value", "n_node_samples",
+                "weighted_n_node_samples",
+            )
+        }
+        level_target = np.array([targets.sum()])
+        level_weight = np.array([total_weight])
+        level_samples = np.array([n_objects])
+        first_node = 0
+        depth = 0
+
+        # Объекты узлов, которые ещё можно разбить, сгруппированы по слотам
+        slot_node = np.flatnonzero(
+            self._splittable(level_samples, level_weight, depth, max_depth)
+        )
+        rows = np.arange(n_objects) if len(slot_node) else np.arange(0)
+        slot_starts = np.array([0, len(rows)])[:len(slot_node) + 1]
+        histograms = None
+
+        while True:
+            n_level = len(level_target)
+            n_slots = len(slot_node)
+            # Пока узлов мало, гистограммы строятся целиком; в глубине
+            # дерева, где в узлах мало объектов, разбиения ищутся только
+            # по занятым корзинам
+            dense = (
+                histograms is not None
+                or n_slots * n_cells <= len(rows) * n_features
+            )
+            if histograms is not None:
+                chunks = [(0, n_slots)]
+            elif dense:
+                chunks = _chunks(
+                    np.arange(n_slots + 1),
+                    _MAX_HIST_VALUES // finder.n_channels // n_cells
+                )
+            else:
+                chunks = _chunks(slot_starts, _MAX_HIST_VALUES // n_features)
+
+            splits = _Splits.empty(n_slots)
+            for start, stop in chunks:
+                feature_mask = None
+                if n_split_features < n_features:
+                    keys = rng.random((stop - start, n_features))
+                    feature_mask = np.zeros(keys.shape, dtype=np.bool_)
+                    np.put_along_axis(
+                        feature_mask,
+                        np.argsort(keys, axis=1)[:, :n_split_features],
+                        True,
+                        axis=1,
+                    )
+
+                lo, hi = slot_starts[start], slot_starts[stop]
+                chunk_rows = rows[lo:hi]
+                chunk_slots = np.repeat(
+                    np.arange(stop - start),
+                    np.diff(slot_starts[start:stop + 1])
+                )
+                if not dense:
+                    splits[start:stop] = finder.sparse_best_splits(
+                        chunk_rows, chunk_slots, stop - start, feature_mask
+                    )
+                    continue
+                if histograms is None:
+                    chunk_histograms = finder.histograms(
+                        chunk_rows, chunk_slots, stop - start
+                    )
+                    if stop - start == n_slots:
+                        histograms = chunk_histograms
+                else:
+                    chunk_histograms = histograms
+                splits[start:stop] = finder.dense_best_splits(
+                    chunk_histograms, feature_mask
+                )
+
+            split_slots = np.flatnonzero(splits.feature >= 0)
+            split = splits[split_slots]
+            split_nodes = slot_node[split_slots]
+            n_splits = len(split_slots)
+            next_first = first_node + n_level
+            left_ids = next_first + 2 * np.arange(n_splits)
+
+            level_feature = np.full(n_level, _TREE_UNDEFINED, dtype=np.intp)
+            level_threshold = np.full(n_level, _TREE_UNDEFINED, dtype=np.float64)
+            level_missing = np.zeros(n_level, dtype=np.uint8)
+            level_left = np.full(n_level, _TREE_LEAF, dtype=np.intp)
+            level_right = np.full(n_level, _TREE_LEAF, dtype=np.intp)
+            level_feature[split_nodes] = split.feature
+            level_threshold[split_nodes] = finder.thresholds(
+                split.feature, split.bin
+            )
+            level_missing[split_nodes] = split.missing_go_to_left
+            level_left[split_nodes] = left_ids
+            level_right[split_nodes] = left_ids + 1
+
+            for name, array in (
+                ("children_left", level_left),
+                ("children_right", level_right),
+                ("feature", level_feature),
+                ("threshold", level_threshold),
+                ("missing_go_to_left", level_missing),
+                ("value", level_target / level_weight),
+                ("n_node_samples", level_samples),
+                ("weighted_n_node_samples", level_weight),
+            ):
+                nodes[name].append(array)
+            if n_splits == 0:
+                break
+
+            # Суммы потомков: левый из разбиения, правый - остаток родителя
+            parent_target = level_target[split_nodes]
+            parent_weight = level_weight[split_nodes]
+            parent_samples = level_samples[split_nodes]
+            level_target = np.column_stack([
+                split.left_target, parent_target - split.left_target
+            ]).ravel()
+            level_weight = np.column_stack([
+                split.left_weight, parent_weight - split.left_weight
+            ]).ravel()
+            level_samples = np.column_stack([
+                split.left_samples, parent_samples - split.left_samples
+            ]).ravel()
+            first_node = next_first
+            depth += 1
+
+            # Раскладываем объекты разбитых узлов по потомкам
+            slot_split = np.full(n_slots, -1, dtype=np.intp)
+            slot_split[split_slots] = np.arange(n_splits)
+            row_split = np.repeat(slot_split, np.diff(slot_starts))
+            keep = row_split >= 0
+            rows, row_split = rows[keep], row_split[keep]
+            row_feature = split.feature[row_split]
+            codes = X_binned[rows, row_feature]
+            go_right = np.where(
+                codes == finder.n_bins[row_feature],
+                ~split.missing_go_to_left[row_split],
+                codes > split.bin[row_split],
+            )
+            row_child = 2 * row_split + go_right
+
+            child_active = self._splittable(
+                level_samples, level_weight, depth, max_depth
+            )
+            n_active = int(child_active.sum())
+            n_active_rows = int(level_samples[child_active].sum())
+            next_histograms = None
+            if (
+                histograms is not None
+                and 0 < n_active * finder.n_channels * n_cells <= _MAX_HIST_VALUES
+                and n_active * n_cells <= n_active_rows * n_features
+            ):
+                # Гистограмма меньшего потомка строится по его объектам,
+                # большего - вычитанием её из гистограммы родителя
+                smaller_right = level_samples[1::2] < level_samples[0::2]
+                pair_needed = child_active[0::2] | child_active[1::2]
+                pair_index = np.cumsum(pair_needed) - 1
+                in_smaller = (
+                    (go_right == smaller_right[row_split])
+                    & pair_needed[row_split]
+                )
+                smaller = finder.histograms(
+                    rows[in_smaller],
+                    pair_index[row_split[in_smaller]],
+                    int(pair_needed.sum()),
+                )
+                children = np.flatnonzero(child_active)
+                child_pair = children // 2
+                next_histograms = smaller[:, pair_index[child_pair]]
+                larger = (children % 2 == 1) != smaller_right[child_pair]
+                next_histograms[:, larger] = (
+                    histograms[:, split_slots[child_pair[larger]]]
+                    - next_histograms[:, larger]
+                )
+
+            # Объекты узлов, которые можно разбить дальше, группируются
+            # по новым слотам
+            child_slot = np.full(len(child_active), -1, dtype=np.intp)
+            child_slot[child_active] = np.arange(n_active)
+            row_slot = child_slot[row_child]
+            keep = row_slot >= 0
+            rows, row_slot = rows[keep], row_slot[keep]
+            rows = rows[np.argsort(row_slot, kind="stable")]
+            slot_node = np.flatnonzero(child_active)
+            slot_starts = np.concatenate([
+                [0], np.cumsum(np.bincount(row_slot, minlength=n_active))
+            ])
+            histograms = next_histograms
+
+        self.tree_ = _TreeStructure(
+            children_left=np.concatenate(nodes["children_left"]),
+            children_right=np.concatenate(nodes["children_right"]),
+            feature=np.concatenate(nodes["feature"]),
+            threshold=np.concatenate(nodes["threshold"]),
+            missing_go_to_left=np.concatenate(nodes["missing_go_to_left"]),
+            value=np.concatenate(nodes["value"])[:, np.newaxis, np.newaxis],
+            n_node_samples=np.concatenate(nodes["n_node_samples"]),
+            weighted_n_node_samples=np.concatenate(
+                nodes["weighted_n_node_samples"]
+            ),
+            max_depth=depth,
+        )
+        self.n_features_in_ = n_features
+        return self
+
+    def _splittable(
+            self,
+            samples: npt.NDArray[np.intp],
+            weight: npt.NDArray[np.float64],
+            depth: int,
+            max_depth: float
+    ) -> npt.NDArray[np.bool_]:
+        """
+        Check which nodes of a level may be split further.
+
+        Args:
+            samples (npt.NDArray[np.intp]): Number of objects
+                in every node.
+            weight (npt.NDArray[np.float64]): Total weight of
+                every node.
+            depth (int): Depth of the level.
+            max_depth (float): Maximum depth of the tree.
+
+        Returns:
+            npt.NDArray[np.bool_]: Mask of nodes to split.
+        """
+        return (
+            (depth < max_depth)
+            & (samples >= self.min_samples_split)
+            & (samples >= 2 * self.min_samples_leaf)
+            & (weight > 0)
+        )
+
+    def apply(
+            self,
+            X: npt.NDArray[np.float64]
+    ) -> npt.NDArray[np.intp]:
+        """
+        Find the leaves the objects fall into.
+
+        Args:
+            X (npt.NDArray[np.float64]): Objects features matrix,
+                array of shape (n_objects, n_features).
+
+        Returns:
+            npt.NDArray[np.intp]: Leaf indices, array of shape
+                (n_objects,).
+        """
+        # Признаки сравниваются во float32, как и при квантовании
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f"X has {X.shape[-1]} features, but HistogramTreeRegressor "
+                f"is expecting {self.n_features_in_} features as input."
+            )
+
+        tree = self.tree_
+        node_ids = np.arange(tree.node_count)
+        is_leaf = tree.children_left == _TREE_LEAF
+        left = np.where(is_leaf, node_ids, tree.children_left)
+        right = np.where(is_leaf, node_ids, tree.children_right)
+        feature = np.where(is_leaf, 0, tree.feature)
+        missing_go_to_right = ~tree.missing_go_to_left.astype(np.bool_)
+
+        objects = np.arange(X.shape[0])
+        nodes = np.zeros(X.shape[0], dtype=np.intp)
+        for _ in range(tree.max_depth):
+            x = X[objects, feature[nodes]]
+            go_right = np.where(
+                np.isnan(x),
+                missing_go_to_right[nodes],
+                x > tree.threshold[nodes],
+            )
+            nodes = np.where(go_right, right[nodes], left[nodes])
+        return nodes
+
+    def predict(
+            self,
+            X: npt.NDArray[np.float64]
+    ) -> npt.NDArray[np.float64]:
+        """
+        Predict with the values of the leaves the objects fall into.
+
+        Args:
+            X (npt.NDArray[np.float64]): Objects features matrix,
+                array of shape (n_objects, n_features).
+
+        Returns:
+            npt.NDArray[np.float64]: Predicted values, array of
+                shape (n_objects,).
+        """
+        return self.tree_.value[self.apply(X), 0, 0]
+
+
+class _Splits:
+    """Chosen splits of a batch of nodes, one entry per node."""
+
+    _FIELDS = (
+        "feature", "bin", "missing_go_to_left",
+        "left_target", "left_weight", "left_samples",
+    )
+
+    def __init__(
+        self,
+        feature: npt.NDArray[np.intp],
+        bin: npt.NDArray[np.intp],
+        missing_go_to_left: npt.NDArray[np.bool_],
+        left_target: npt.NDArray[np.float64],
+        left_weight: npt.NDArray[np.float64],
+        left_samples: npt.NDArray[np.intp],
+    ) -> None:
+        self.feature = feature
+        self.bin = bin
+        self.missing_go_to_left = missing_go_to_left
+        self.left_target = left_target
+        self.left_weight = left_weight
+        self.left_samples = left_samples
+
+    @classmethod
+    def empty(cls, n_nodes: int) -> "_Splits":
+        """Create entries of `n_nodes` nodes that are not split."""
+        return cls(
+            feature=np.full(n_nodes, -1, dtype=np.intp),
+            bin=np.zeros(n_nodes, dtype=np.intp),
+            missing_go_to_left=np.zeros(n_nodes, dtype=np.bool_),
+            left_target=np.zeros(n_nodes),
+            left_weight=np.zeros(n_nodes),
+            left_samples=np.zeros(n_nodes, dtype=np.intp),
+        )
+
+    def __getitem__(self, index: Any) -> "_Splits":
+        return _Splits(**{
+            name: getattr(self, name)[index] for name in self._FIELDS
+        })
+
+    def __setitem__(self, index: Any, other: "_Splits") -> None:
+        for name in self._FIELDS:
+            getattr(self, name)[index] = getattr(other, name)
+
+
+class _SplitFinder:
+    """Search of the best node splits over the binned training data."""
+
+    def __init__(
+        self,
+        X_binned: npt.NDArray[np.uint8],
+        targets: npt.NDArray[np.float64],
+        weights: npt.NDArray[np.float64] | None,
+        bin_mapper: BinMapper,
+        min_samples_leaf: int,
+    ) -> None:
+        self.X_binned = X_binned
+        self.targets = targets
+        self.weights = weights
+        self.min_samples_leaf = min_samples_leaf
+        # Каналы: суммы целевых значений, веса (если заданы) и число объектов;
+        # без весов вес узла совпадает с числом объектов
+        self.n_channels = 2 if weights is None else 3
+
+        # Корзины всех признаков идут подряд: у признака f сначала
+        # n_bins[f] корзин значений, затем корзина пропусков
+        self.n_bins = bin_mapper.n_bins_
+        self.segments = self.n_bins + 1
+        self.offsets = np.concatenate([[0], np.cumsum(self.segments)[:-1]])
+        self.n_cells = int(self.segments.sum())
+        self.cell_feature = np.repeat(np.arange(len(self.n_bins)), self.segments)
+        self.cell_bin = np.arange(self.n_cells) - self.offsets[self.cell_feature]
+        self.missing_cells = self.offsets + self.n_bins
+        # Разбиение по последней корзине значений отделяет только пропуски,
+        # а по корзине пропусков невозможно
+        self.candidates = self.cell_bin < self.n_bins[self.cell_feature] - 1
+        self.edges = np.concatenate(bin_mapper.bin_thresholds_ + [np.empty(0)])
+        self.edge_offsets = np.concatenate(
+            [[0], np.cumsum(self.n_bins - 1)[:-1]]
+        )
+
+    def thresholds(
+            self,
+            feature: npt.NDArray[np.intp],
+            bin: npt.NDArray[np.intp]
+    ) -> npt.NDArray[np.float64]:
+        """Get the feature thresholds of splits on the given bins."""
+        return self.edges[self.edge_offsets[feature] + bin]
+
+    def _sums(
+            self,
+            keys: npt.NDArray[np.intp],
+            rows: npt.NDArray[np.intp],
+            size: int
+    ) -> npt.NDArray[np.float64]:
+        """Sum the channels of the objects `rows` into the bins `keys`."""
+        sums = np.empty((self.n_channels, size))
+        sums[0] = np.bincount(keys, weights=self.targets[rows], minlength=size)
+        if self.weights is not None:
+            sums[1] = np.bincount(
+                keys, weights=self.weights[rows], minlength=size
+            )
+        sums[-1] = np.bincount(keys, minlength=size)
+        return sums
+
+    def _cell_keys(
+            self,
+            rows: npt.NDArray[np.intp],
+            slots: npt.NDArray[np.intp]
+    ) -> npt.NDArray[np.intp]:
+        """Get the histogram cell of every object and feature of the nodes."""
+        return (
+            (slots[:, np.newaxis] * self.n_cells + self.offsets)
+            + self.X_binned[rows]
+        )
+
+    def histograms(
+            self,
+            rows: npt.NDArray[np.intp],
+            slots: npt.NDArray[np.intp],
+            n_slots: int
+    ) -> npt.NDArray[np.float64]:
+        """
+        Build histograms of several nodes in one pass over their objects.
+
+        Args:
+            rows (npt.NDArray[np.intp]): Objects of the nodes.
+            slots (npt.NDArray[np.intp]): Node of every object,
+                between 0 and `n_slots - 1`.
+            n_slots (int): Number of nodes.
+
+        Returns:
+            npt.NDArray[np.float64]: Sums of targets, weights (if any)
+                and counts of objects, array of shape
+                (n_channels, n_slots, n_cells).
+        """
+        histograms = np.empty((self.n_channels, n_slots, self.n_cells))
+        channels = [self.targets[rows]]
+        if self.weights is not None:
+            channels.append(self.weights[rows])
+        codes = self.X_binned[rows]
+
+        # Признаки обрабатываются по одному, чтобы временные массивы
+        # оставались размером с число объектов
+        for f, (offset, segment) in enumerate(zip(self.offsets, self.segments)):
+            keys = slots * segment + codes[:, f]
+            size = n_slots * segment
+            cells = slice(offset, offset + segment)
+            for channel, values in enumerate(channels):
+                histograms[channel, :, cells] = np.bincount(
+                    keys, weights=values, minlength=size
+                ).reshape(n_slots, segment)
+            histograms[-1, :, cells] = np.bincount(
+                keys, minlength=size
+            ).reshape(n_slots, segment)
+        return histograms
+
+    def dense_best_splits(
+            self,
+            histograms: npt.NDArray[np.float64],
+            feature_mask: npt.NDArray[np.bool_] | None
+    ) -> _Splits:
+        """
+        Find the best split of every node from its full histogram.
+
+        Args:
+            histograms (npt.NDArray[np.float64]): Histograms built
+                by `histograms`.
+            feature_mask (npt.NDArray[np.bool_] | None): Features
+                allowed at every node, array of shape
+                (n_nodes, n_features), None means all.
+
+        Returns:
+            _Splits: Best splits, feature -1 for nodes not worth
+                splitting.
+        """
+        n_nodes = histograms.shape[1]
+        values = histograms.copy()
+        values[:, :, self.missing_cells] = 0
+        cumulative = np.cumsum(values, axis=2)
+        before = cumulative[:, :, self.offsets] - values[:, :, self.offsets]
+        left = cumulative - np.repeat(before, self.segments, axis=2)
+        missing = np.repeat(
+            histograms[:, :, self.missing_cells], self.segments, axis=2
+        )
+        total = histograms[:, :, :self.segments[0]].sum(axis=2, keepdims=True)
+
+        allowed = np.broadcast_to(self.candidates, (n_nodes, self.n_cells))
+        if feature_mask is not None:
+            allowed = allowed & feature_mask[:, self.cell_feature]
+
+        gain, missing_left = self._gains(left, missing, total, allowed)
+        nodes = np.arange(n_nodes)
+        cell = gain.argmax(axis=1)
+        return self._splits(
+            is_split=np.isfinite(gain[nodes, cell]),
+            feature=self.cell_feature[cell],
+            bin=self.cell_bin[cell],
+            missing_left=missing_left[nodes, cell],
+            left=left[:, nodes, cell],
+            missing=missing[:, nodes, cell],
+            total=total[:, :, 0],
+        )
+
+    def sparse_best_splits(
+            self,
+            rows: npt.NDArray[np.intp],
+            slots: npt.NDArray[np.intp],
+            n_slots: int,
+            feature_mask: npt.NDArray[np.bool_] | None
+    ) -> _Splits:
+        """
+        Find the best split of every node from its occupied bins only.
+
+        Small nodes fill few bins, so sums are gathered only for the
+        bins their objects fall into. Splits on empty bins repeat the
+        split on the previous occupied one, so the result is the same
+        as with full histograms.
+
+        Args:
+            rows (npt.NDArray[np.intp]): Objects of the nodes,
+                grouped by node.
+            slots (npt.NDArray[np.intp]): Node of every object,
+                between 0 and `n_slots - 1`, non-decreasing.
+            n_slots (int): Number of nodes.
+            feature_mask (npt.NDArray[np.bool_] | None): Features
+                allowed at every node, array of shape
+                (n_nodes, n_features), None means all.
+
+        Returns:
+            _Splits: Best splits, feature -1 for nodes not worth
+                splitting.
+        """
+        n_features = self.X_binned.shape[1]
+        keys = self._cell_keys(rows, slots)
+        key_rows = np.broadcast_to(rows[:, np.newaxis], keys.shape)
+        if feature_mask is not None:
+            # Признаки, не выбранные для узла, не участвуют в поиске
+            allowed_keys = feature_mask[slots]
+            keys, key_rows = keys[allowed_keys], key_rows[allowed_keys]
+        else:
+            keys, key_rows = keys.ravel(), key_rows.ravel()
+        cells, inverse = np.unique(keys, return_inverse=True)
+        sums = self._sums(inverse, key_rows, len(cells))
+        entry_slot = cells // self.n_cells
+        entry_cell = cells % self.n_cells
+        entry_feature = self.cell_feature[entry_cell]
+        is_missing = self.cell_bin[entry_cell] == self.n_bins[entry_feature]
+
+        # Ячейки упорядочены по узлу, затем по признаку и корзине, так что
+        # корзины одного признака узла образуют непрерывную группу
+        group = entry_slot * n_features + entry_feature
+        is_first = np.concatenate([[True], group[1:] != group[:-1]])
+        entry_group = np.cumsum(is_first) - 1
+        values = np.where(is_missing, 0.0, sums)
+        cumulative = np.cumsum(values, axis=1)
+        before = (cumulative - values)[:, is_first]
+        left = cumulative - before[:, entry_group]
+        group_missing = np.zeros((self.n_channels, int(is_first.sum())))
+        group_missing[:, entry_group[is_missing]] = sums[:, is_missing]
+        missing = group_missing[:, entry_group]
+        total = self._sums(slots, rows, n_slots)
+
+        allowed = self.candidates[entry_cell]
+        if feature_mask is not None:
+            allowed = allowed & feature_mask[entry_slot, entry_feature]
+        gain, missing_left = self._gains(
+            left, missing, total[:, entry_slot], allowed
+        )
+
+        # Первая ячейка с наибольшим выигрышем в каждом узле
+        slot_first = np.searchsorted(entry_slot, np.arange(n_slots))
+        best_gain = np.maximum.reduceat(gain, slot_first)
+        candidates = np.flatnonzero(gain == best_gain[entry_slot])
+        best = candidates[np.searchsorted(
+            entry_slot[candidates], np.arange(n_slots)
+        )]
+        entry_cell = entry_cell[best]
+        return self._splits(
+            is_split=np.isfinite(best_gain),
+            feature=entry_feature[best],
+            bin=self.cell_bin[entry_cell],
+            missing_left=missing_left[best],
+            left=left[:, best],
+            missing=missing[:, best],
+            total=total,
+        )
+
+    def _gains(
+            self,
+            left: npt.NDArray[np.float64],
+            missing: npt.NDArray[np.float64],
+            total: npt.NDArray[np.float64],
+            allowed: npt.NDArray[np.bool_]
+    ) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.bool_]]:
+        """
+        Score candidate splits by the decrease of squared error.
+
+        Every candidate is tried with missing values sent to the
+        right and, if the node has any, to the left.
+
+        Args:
+            left (npt.NDArray[np.float64]): Channel sums of the
+                non-missing objects going left.
+            missing (npt.NDArray[np.float64]): Channel sums of the
+                objects with the feature missing.
+            total (npt.NDArray[np.float64]): Channel sums of the
+                node, broadcastable to `left`.
+            allowed (npt.NDArray[np.bool_]): Candidates to score.
+
+        Returns:
+            tuple[npt.NDArray[np.float64], npt.NDArray[np.bool_]]:
+                Best gain of every candidate, -inf if it is not
+                valid, and whether missing values go left for it.
+        """
+        best = missing_left = None
+        with np.errstate(divide="ignore", invalid="ignore"):
+            parent_term = total[0] ** 2 / total[1]
+            for to_left in (False, True):
+                stats = left + missing if to_left else left
+                right = total - stats
+                left_term = stats[0] ** 2 / stats[1]
+                right_term = right[0] ** 2 / right[1]
+                gain = left_term + right_term - parent_term
+                valid = (
+                    allowed
+                    & (stats[-1] >= self.min_samples_leaf)
+                    & (right[-1] >= self.min_samples_leaf)
+                    & (stats[1] > 0)
+                    & (right[1] > 0)
+                    & (gain > _GAIN_RTOL * (left_term + right_term))
+                )
+                if to_left:
+                    valid &= missing[-1] > 0
+                gain = np.where(valid, gain, -np.inf)
+                if best is None:
+                    best = gain
+                    missing_left = np.zeros(gain.shape, dtype=np.bool_)
+                    # Без пропусков второй вариант совпадает с первым
+                    if not missing[-1].any():
+                        break
+                else:
+                    missing_left = gain > best
+                    best = np.maximum(best, gain)
+        return best, missing_left
+
+    def _splits(
+            self,
+            is_split: npt.NDArray[np.bool_],
+            feature: npt.NDArray[np.intp],
+            bin: npt.NDArray[np.intp],
+            missing_left: npt.NDArray[np.bool_],
+            left: npt.NDArray[np.float64],
+            missing: npt.NDArray[np.float64],
+            total: npt.NDArray[np.float64]
+    ) -> _Splits:
+        """Collect the chosen candidates of the nodes into `_Splits`."""
+        stats = left + missing * missing_left
+        left_samples = stats[-1]
+        # Если в узле не было пропусков, при предсказании они пойдут
+        # в потомок с большим числом объектов
+        no_missing = missing[-1] == 0
+        missing_left = missing_left | (
+            no_missing & (left_samples >= total[-1] - left_samples)
+        )
+        return _Splits(
+            feature=np.where(is_split, feature, -1),
+            bin=bin,
+            missing_go_to_left=missing_left,
+            left_target=stats[0],
+            left_weight=stats[1],
+            left_samples=left_samples.astype(np.intp),
+        )
+
+
+def _chunks(
+        starts: npt.NDArray[np.intp],
+        limit: int
+) -> list[tuple[int, int]]:
+    """
+    Split consecutive nodes into runs of at most `limit` units each.
+
+    Args:
+        starts (npt.NDArray[np.intp]): Cumulative sizes of the
+            nodes, array of shape (n_nodes + 1,).
+        limit (int): Maximum total size of a run; a single node
+            larger than that forms a run of its own.
+
+    Returns:
+        list[tuple[int, int]]: Start and stop node of every run.
+    """
+    chunks = []
+    start, n_nodes = 0, len(starts) - 1
+    while start < n_nodes:
+        stop = int(np.searchsorted(starts, starts[start] + limit, side="right")) - 1
+        stop = min(max(stop, start + 1), n_nodes)
+        chunks.append((start, stop))
+        start = stop
+    return chunks
+
+
+def _n_split_features(
+        max_features: int | float | str | None,
+        n_features: int
+) -> int:
+    """Resolve `max_features` into a number of features as sklearn does."""
+    if max_features is None:
+        return n_features
+    if max_features == "sqrt":
+        return max(1, int(np.sqrt(n_features)))
+    if max_features == "log2":
+        return max(1, int(np.log2(n_features)))
+    if isinstance(max_features, (int, np.integer)):
+        return min(int(max_features), n_features)
+    if isinstance(max_features, float):
+        return max(1, int(max_features * n_features))
+    raise ValueError(f"Unsupported max_features: {max_features!r}")
+
+
+TreeRegressor = Union[DecisionTreeRegressor, HistogramTreeRegressor]
+
+
+def make_tree(
+        tree_params: dict[str, Any]
+) -> TreeRegressor:
+    """
+    Create an unfitted ensemble tree from `tree_params`.
+
+    The `tree_method` key selects the learner: 'exact' (default)
+    for sklearn's `DecisionTreeRegressor` or 'hist' for
+    `HistogramTreeRegressor`. Other keys are passed to the tree,
+    except `max_bins`, which only histogram trees have.
+
+    Args:
+        tree_params (dict[str, Any]): Parameters of the tree.
+
+    Returns:
+        TreeRegressor: The unfitted tree.
+    """
+    params = dict(tree_params)
+    tree_method = params.pop("tree_method", "exact")
+    if tree_method == "hist":
+        return HistogramTreeRegressor(**params)
+    if tree_method == "exact":
+        # Число корзин не имеет смысла для точных деревьев
+        params.pop("max_bins", None)
+        return DecisionTreeRegressor(**params)
+    raise ValueError(
+        f"tree_method must be 'exact' or 'hist', got {tree_method!r}"
+    )
+
+
+def check_features(
+        X: npt.ArrayLike,
+        order: str = "C"
+) -> npt.NDArray[np.float32]:
+    """
+    Validate a feature matrix and convert it to float32 once.
+
+    Both tree learners compare features in float32, so the conversion
+    loses nothing and saves the copies sklearn would otherwise make
+    on every `fit` and `predict` call. Trees are fit fastest on the
+    Fortran order, the compiled forest reads the C order. A float32
+    matrix with contiguous columns, such as a slice of rows of a
+    Fortran-ordered one, is taken as Fortran-ordered without a copy.
+
+    Args:
+        X (npt.ArrayLike): Objects features matrix, array of shape
+            (n_objects, n_features).
+        order (str, optional): Memory layout of the result, 'C'
+            or 'F'. Defaults to 'C'.
+
+    Returns:
+        npt.NDArray[np.float32]: The features, copied only if their
+            type or layout differ.
+
+    Raises:
+        ValueError: If `X` is not a matrix of numbers or holds values
+            that do not fit in float32.
+    """
+    X = np.asarray(X)
+    if X.ndim != 2:
+        raise ValueError(f"X must be a 2D array, got {X.ndim}D")
+    # Срез строк матрицы в порядке Fortran не непрерывен, но столбцы в нём
+    # по-прежнему лежат подряд, и деревьям этого достаточно
+    columns_contiguous = X.dtype == np.float32 and X.strides[0] == X.itemsize
+    try:
+        if not (order == "F" and columns_contiguous):
+            X = np.asarray(X, dtype=np.float32, order=order)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"X must contain only numbers: {e}") from None
+    # Пропуски деревья обрабатывают сами, бесконечности - нет
+    if np.isinf(X).any():
+        raise ValueError("X contains infinity or a value too large for float32")
+    return X
+
+
+def bin_features(
+        X: npt.NDArray[np.float64],
+        tree_params: dict[str, Any]
+) -> tuple[npt.NDArray[Any], BinMapper | None]:
+    """
+    Prepare the training matrix for the trees of an ensemble.
+
+    Histogram trees get the features quantized once for the whole
+    ensemble, exact trees get `X` as is.
+
+    Args:
+        X (npt.NDArray[np.float64]): Objects features matrix,
+            array of shape (n_objects, n_features).
+        tree_params (dict[str, Any]): Parameters of the trees.
+
+    Returns:
+        tuple[npt.NDArray[Any], BinMapper | None]: Matrix to fit
+            the trees on and the mapper that binned it, if any.
+    """
+    if tree_params.get("tree_method", "exact") != "hist":
+        return X, None
+    bin_mapper = BinMapper(max_bins=tree_params.get("max_bins", MAX_BINS))
+    return bin_mapper.fit_transform(X), bin_mapper
+
+
+def fit_tree(
+        tree: TreeRegressor,
+        X: npt.NDArray[Any],
+        y: npt.NDArray[np.float64],
+        bin_mapper: BinMapper | None = None,
+        sample_weight: npt.NDArray[np.float64] | None = None
+) -> TreeRegressor:
+    """
+    Fit an ensemble tree on the matrix prepared by `bin_features`.
+
+    Args:
+        tree (TreeRegressor): Unfitted tree.
+        X (npt.NDArray[Any]): Raw features for exact trees or
+            bin codes for histogram trees.
+        y (npt.NDArray[np.float64]): Regression labels,
+            array of shape (n_objects,).
+        bin_mapper (BinMapper | None, optional): Mapper that
+            binned `X`. Defaults to None (raw features).
+        sample_weight (npt.NDArray[np.float64] | None, optional):
+            Weights of the objects. Defaults to None.
+
+    Returns:
+        TreeRegressor: The fitted tree.
+    """
+    if bin_mapper is None:
+        return tree.fit(X, y, sample_weight=sample_weight)
+    return tree.fit_binned(X, y, bin_mapper, sample_weight=sample_weight)
@@ -1,40 +1,225 @@
 import json
+import time
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator, Literal
 
 import joblib
 import numpy as np
 import numpy.typing as npt
-from sklearn.tree import DecisionTreeRegressor
 
-from ensembles.utils import ConvergenceHistory
+from ensembles.compiled import FOREST_FILE, CompiledForest
+from ensembles.hist import (
+    BinMapper,
+    TreeRegressor,
+    bin_features,
+    check_features,
+    fit_tree,
+    make_tree,
+)
+from ensembles.utils import (
+    ConvergenceHistory,
+    ProgressCallback,
+    check_dtype,
+    rmsle,
+)
+
+
+def _bootstrap_indices(
+        rng: np.random.Generator,
+        n_objects: int
+) -> npt.NDArray[np.int64]:
+    """
+    Draw the bootstrap sample of a tree.
+
+    Args:
+        rng (np.random.Generator): Tree's own generator, before
+            anything else is drawn from it.
+        n_objects (int): Number of training objects.
+
+    Returns:
+        npt.NDArray[np.int64]: Indices of the sampled objects,
+            array of shape (n_objects,).
+    """
+    # Bootstrap sampling: случайная выборка с возвращением
+    return rng.integers(
+        low=0,
+        high=n_objects,
+        size=n_objects
+    )
+
+
+def _out_of_bag_mask(
+        seed: np.random.SeedSequence,
+        n_objects: int
+) -> npt.NDArray[np.bool_]:
+    """
+    Find the objects left out of a tree's bootstrap sample.
+
+    The sample is drawn again from the tree's seed, exactly as
+    `_fit_tree` did, so nothing has to be kept per tree.
+
+    Args:
+        seed (np.random.SeedSequence): Tree's own seed sequence.
+        n_objects (int): Number of training objects.
+
+    Returns:
+        npt.NDArray[np.bool_]: Whether every object is out of
+            bag, array of shape (n_objects,).
+    """
+    bootstrap_indices = _bootstrap_indices(
+        np.random.default_rng(seed),
+        n_objects
+    )
+    return np.bincount(bootstrap_indices, minlength=n_objects) == 0
+
+
+def _fit_tree(
+        tree: TreeRegressor,
+        X: npt.NDArray[Any],
+        y: npt.NDArray[np.float64],
+        seed: np.random.SeedSequence,
+        bin_mapper: BinMapper | None = None,
+        bootstrap: Literal["indices", "weights"] = "indices"
+) -> TreeRegressor:
+    """
+    Fit a single forest tree on its own bootstrap sample.
+
+    Both the bootstrap indices and the tree's internal `random_state`
+    are drawn from a generator built on `seed`, so the result depends
+    only on the seed and not on the order in which workers run.
+    With `bootstrap='weights'` the sample is not copied: the tree is
+    fit on the shared `X` with the number of times every object was
+    drawn as its weight. Leaf and split size limits then count
+    distinct objects, so the tree may differ from the one fit on
+    the resampled copy.
+
+    Args:
+        tree (TreeRegressor): Unfitted tree.
+        X (npt.NDArray[Any]): Objects features matrix or its bin
+            codes for histogram trees, array of shape
+            (n_objects, n_features).
+        y (npt.NDArray[np.float64]): Regression labels,
+            array of shape (n_objects,).
+        seed (np.random.SeedSequence): Tree's own seed sequence.
+        bin_mapper (BinMapper | None, optional): Mapper that
+            binned `X`. Defaults to None (raw features).
+        bootstrap (Literal["indices", "weights"], optional): How
+            the bootstrap sample is passed to the tree. Defaults
+            to 'indices'.
+
+    Returns:
+        TreeRegressor: The fitted tree.
+    """
+    rng = np.random.default_rng(seed)
+    n_objects = X.shape[0]
+    bootstrap_indices = _bootstrap_indices(rng, n_objects)
+    tree.set_params(
+        random_state=int(rng.integers(np.iinfo(np.int32).max))
+    )
+    if bootstrap == "weights":
+        # Кратности объектов в выборке вместо её копии
+        return fit_tree(
+            tree,
+            X=X,
+            y=y,
+            bin_mapper=bin_mapper,
+            sample_weight=np.bincount(
+                bootstrap_indices,
+                minlength=n_objects
+            ).astype(np.float64)
+        )
+    return fit_tree(
+        tree,
+        X=X[bootstrap_indices],
+        y=y[bootstrap_indices],
+        bin_mapper=bin_mapper
+    )
 
 
 class RandomForestMSE:
     def __init__(
         self,
         n_estimators: int,
-        tree_params: dict[str, Any] | None = None
+        tree_params: dict[str, Any] | None = None,
+        n_jobs: int | None = None,
+        random_state: int | None = None,
+        warm_start: bool = False,
+        bootstrap: Literal["indices", "weights"] = "indices",
+        oob_score: bool = False,
+        dtype: npt.DTypeLike = np.float64,
     ) -> None:
         """
         Handmade random forest regressor.
 
         Classic ML algorithm that trains a set of independent tall
         decision trees and averages its predictions.
-        Employs scikit-learn `DecisionTreeRegressor` under the hood.
+        Employs scikit-learn `DecisionTreeRegressor` under the hood,
+        or `HistogramTreeRegressor` with `tree_method='hist'`.
 
         Args:
             n_estimators (int): Number of trees in the forest.
             tree_params (dict[str, Any] | None, optional): Parameters
-                for sklearn trees. Defaults to None.
+                of the trees. The `tree_method` key selects 'exact'
+                sklearn trees or 'hist' trees fitted on features
+                binned once per `fit` into `max_bins` bins.
+                Defaults to None.
+            n_jobs (int | None, optional): Number of threads used to
+                fit trees, `-1` means all cores. Defaults to None
+                (sequential fitting).
+            random_state (int | None, optional): Seed of the forest.
+                Every tree gets an independent random stream spawned
+                from it, so the fitted forest does not depend on
+                `n_jobs`. Defaults to None.
+            warm_start (bool, optional): Whether `fit` keeps the
+                already fitted trees and only adds new ones up to
+                `n_estimators`. The added trees get the same random
+                streams they would have in a forest fitted at once.
+                Defaults to False.
+            bootstrap (Literal["indices", "weights"], optional): How
+                bootstrap samples reach the trees: 'indices' fits every
+                tree on a resampled copy of the data, 'weights' fits it
+                on the shared data weighted by the multiplicity of every
+                object, so no per-tree copies of `X` are made. Both
+                draw the same samples, but the trees are not always
+                the same: `min_samples_leaf` and `min_samples_split`
+                count distinct objects rather than their weights, and
+                weighted sums round differently from repeated rows,
+                which may flip nearly tied splits of exact trees.
+                Defaults to 'indices'.
+            oob_score (bool, optional): Whether `fit` estimates the
+                error on out-of-bag objects, i.e. averages every
+                object's predictions over the trees whose bootstrap
+                sample missed it. This gives a validation-quality
+                curve without a holdout set. Defaults to False.
+            dtype (npt.DTypeLike, optional): Floating type of the
+                targets, running predictions and stored leaf values,
+                np.float64 or np.float32. Features are converted once
+                to float32 in either case, since the trees compare
+                them in float32. Defaults to np.float64.
         """
         self.n_estimators = n_estimators
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.warm_start = warm_start
+        if bootstrap not in ("indices", "weights"):
+            raise ValueError(
+                f"bootstrap must be 'indices' or 'weights', got {bootstrap!r}"
+            )
+        self.bootstrap = bootstrap
+        self.oob_score = oob_score
+        self.dtype = check_dtype(dtype)
         if tree_params is None:
             tree_params = {}
+        self.tree_params = tree_params
         self.forest = [
-            DecisionTreeRegressor(**tree_params)
+            make_tree(tree_params)
             for _ in range(n_estimators)
         ]
+        self.seed_entropy: int | None = None
+        self.best_iteration_: int | None = None
+        self.oob_score_: float | None = None
+        self.oob_prediction_: npt.NDArray[np.float64] | None = None
+        self._compiled: CompiledForest | None = None
 
     def fit(
         self,
@@ -44,6 +229,8 @@ class RandomForestMSE:
         y_val: npt.NDArray[np.float64] | None = None,
         trace: bool | None = None,
         patience: int | None = None,
+        callback: ProgressCallback | None = None,
+        convergence_history: ConvergenceHistory | None = None,
     ) -> ConvergenceHistory | None:
         """
         Train an ensemble of trees on the provided data.
@@ -61,84 +248,304 @@ class RandomForestMSE:
                 (n_val_objects,). Defaults to None.
             trace (bool | None, optional): Whether to calculate
                 rmsle while training. True by default if
-                validation data is provided. Defaults to None.
+                validation data is provided or `oob_score` is set.
+                Defaults to None.
             patience (int | None, optional): Number of training
                 steps without decreasing the train loss
-                (or validation if provided), after which to
-                stop training. Defaults to None.
+                (or validation, or out-of-bag if provided), after
+                which to stop training. Defaults to None.
+            callback (ProgressCallback | None, optional): Function
+                called after every fitted tree with the number of
+                trees, current losses (if traced) and elapsed time.
+                Defaults to None.
+            convergence_history (ConvergenceHistory | None, optional):
+                History of the already fitted trees. With `warm_start`
+                the losses of the new trees are appended to its copy
+                instead of being traced from scratch. With `oob_score`
+                the out-of-bag sums of the fitted trees are rebuilt
+                from `X`, which must then be the same training data.
+                Defaults to None.
 
         Returns:
             ConvergenceHistory | None: Instance of `ConvergenceHistory`
             if `trace=True` or if validation data is provided.
         """
-        from ensembles.utils import rmsle, whether_to_stop
+        from ensembles.utils import whether_to_stop
+
+        start_time = time.perf_counter()
+
+        # Признаки приводятся к float32 один раз, а не в каждом дереве:
+        # обучающие - в порядке Fortran, удобном для поиска разбиений
+        X = check_features(X, order="F")
+        y = np.asarray(y, dtype=self.dtype)
+        if X_val is not None:
+            X_val = check_features(X_val)
+        if y_val is not None:
+            y_val = np.asarray(y_val, dtype=self.dtype)
+
+        # При дообучении уже обученные деревья остаются префиксом леса
+        prefix = self._fitted_prefix() if self.warm_start else None
+        n_fitted = prefix.n_trees if prefix is not None else 0
+        if self.n_estimators < n_fitted:
+            raise ValueError(
+                f"n_estimators={self.n_estimators} must be at least the "
+                f"number of already fitted trees ({n_fitted}) to warm start"
+            )
+        if prefix is not None and self.seed_entropy is None and self.oob_score:
+            raise ValueError(
+                "out-of-bag estimation needs the seeds of the fitted trees, "
+                "which this model does not store"
+            )
+        if prefix is None or self.seed_entropy is None:
+            self.seed_entropy = int(
+                np.random.SeedSequence(self.random_state).entropy
+            )
 
         # Определяем, нужно ли отслеживать историю
         if trace is None:
-            trace = X_val is not None and y_val is not None
+            trace = (X_val is not None and y_val is not None) or self.oob_score
 
-        convergence_history: ConvergenceHistory | None = None
-        if trace:
+        if not trace:
+            convergence_history = None
+        elif prefix is not None and convergence_history is not None:
+            convergence_history = {
+                "train": list(convergence_history["train"]),
+                "val": (
+                    list(convergence_history["val"])
+                    if convergence_history.get("val") is not None else None
+                ),
+                "oob": [] if self.oob_score else None,
+            }
+        else:
             convergence_history = {
                 "train": [],
                 "val": [] if X_val is not None and y_val is not None else None,
+                "oob": [] if self.oob_score else None,
             }
 
-        n_objects = X.shape[0]
-
-        # Обучаем каждое дерево на bootstrap-выборке
-        for i, tree in enumerate(self.forest):
-            # Bootstrap sampling: случайная выборка с возвращением
-            bootstrap_indices = np.random.choice(
-                a=n_objects,
-                size=n_objects,
-                replace=True
+        # Каждое дерево получает собственный независимый поток случайности:
+        # i-й поток совпадает с i-м потомком SeedSequence(random_state).spawn
+        new_trees = [
+            make_tree(self.tree_params)
+            for _ in range(n_fitted, self.n_estimators)
+        ]
+        seeds = [
+            np.random.SeedSequence(self.seed_entropy, spawn_key=(i,))
+            for i in range(n_fitted, self.n_estimators)
+        ]
+        # Гистограммные деревья обучаются на признаках, квантованных
+        # один раз для всего леса
+        X_fit, bin_mapper = bin_features(X, self.tree_params)
+        fitted_trees = joblib.Parallel(
+            n_jobs=self.n_jobs,
+            prefer="threads",
+            return_as="generator",
+        )(
+            joblib.delayed(_fit_tree)(
+                tree, X_fit, y, seed, bin_mapper, self.bootstrap
             )
-            X_bootstrap = X[bootstrap_indices]
-            y_bootstrap = y[bootstrap_indices]
-
-            # Обучаем дерево
-            tree.fit(
-                X=X_bootstrap,
-                y=y_bootstrap
+            for tree, seed in zip(new_trees, seeds)
+        )
+
+        # Накопленные суммы предсказаний деревьев: на каждом шаге
+        # добавляется только вклад нового дерева
+        train_sum = np.zeros(X.shape[0], dtype=self.dtype)
+        val_sum = (
+            np.zeros(X_val.shape[0], dtype=self.dtype)
+            if X_val is not None else None
+        )
+        if trace and prefix is not None:
+            train_sum = prefix.predict(X).astype(self.dtype, copy=False)
+            if X_val is not None:
+                val_sum = prefix.predict(X_val).astype(self.dtype, copy=False)
+
+        # Суммы предсказаний деревьев, для которых объект был out-of-bag,
+        # и число таких деревьев
+        oob_sum = oob_count = None
+        if self.oob_score:
+            oob_sum = np.zeros(X.shape[0], dtype=self.dtype)
+            oob_count = np.zeros(X.shape[0], dtype=np.int64)
+        if self.oob_score and prefix is not None:
+            # Выборки прежних деревьев восстанавливаются по их зёрнам,
+            # заодно заново считается out-of-bag кривая префикса
+            for i, tree_prediction in enumerate(prefix.tree_predictions(X)):
+                oob_loss = self._add_out_of_bag(
+                    oob_sum, oob_count, tree_prediction,
+                    np.random.SeedSequence(self.seed_entropy, spawn_key=(i,)),
+                    y,
+                )
+                if convergence_history is not None:
+                    convergence_history["oob"].append(oob_loss)  # type: ignore
+
+        # Деревья приходят в исходном порядке, даже если обучаются параллельно
+        for j, tree in enumerate(fitted_trees):
+            i = n_fitted + j
+            new_trees[j] = tree
+            train_loss = val_loss = oob_loss = None
+
+            # Предсказание дерева на обучающей выборке нужно и для
+            # истории, и для out-of-bag оценки
+            tree_prediction = (
+                tree.predict(X).astype(self.dtype, copy=False)
+                if trace or self.oob_score else None
             )
+            if self.oob_score:
+                oob_loss = self._add_out_of_bag(
+                    oob_sum, oob_count, tree_prediction, seeds[j], y
+                )
 
             # Если нужна история сходимости
             if trace and convergence_history is not None:
                 # Предсказание текущего ансамбля (от 0 до i включительно)
-                y_pred_train = self._predict_trees(
-                    X=X,
-                    n_trees=(i + 1)
-                )
+                train_sum += tree_prediction
                 train_loss = rmsle(
                     y=y,
-                    z=y_pred_train
+                    z=train_sum / (i + 1)
                 )
                 convergence_history["train"].append(train_loss)
 
                 if X_val is not None and y_val is not None:
-                    y_pred_val = self._predict_trees(
-                        X=X_val,
-                        n_trees=(i + 1)
-                    )
+                    val_sum += tree.predict(X_val)
                     val_loss = rmsle(
                         y=y_val,
-                        z=y_pred_val
+                        z=val_sum / (i + 1)
                     )
                     convergence_history["val"].append(val_loss)  # type: ignore
 
+                if self.oob_score:
+                    convergence_history["oob"].append(oob_loss)  # type: ignore
+
+            if callback is not None:
+                callback({
+                    "iteration": i + 1,
+                    "n_estimators": self.n_estimators,
+                    "train": train_loss,
+                    "val": val_loss,
+                    "oob": oob_loss,
+                    "elapsed": time.perf_counter() - start_time,
+                })
+
+            if trace and convergence_history is not None:
                 # Проверка early stopping
                 if patience is not None and whether_to_stop(
                     convergence_history=convergence_history,
                     patience=patience
                 ):
                     # Обрезаем лес до текущего размера
-                    self.forest = self.forest[:i + 1]
+                    new_trees = new_trees[:j + 1]
                     self.n_estimators = i + 1
                     break
 
+        self._set_trees(prefix, new_trees)
+
+        self.oob_score_ = self.oob_prediction_ = None
+        if self.oob_score:
+            # Объекты, попавшие во все бутстрэп-выборки, оценки не получают
+            has_oob = oob_count > 0
+            self.oob_prediction_ = np.full(X.shape[0], np.nan, dtype=self.dtype)
+            self.oob_prediction_[has_oob] = oob_sum[has_oob] / oob_count[has_oob]
+            self.oob_score_ = rmsle(y[has_oob], self.oob_prediction_[has_oob])
+
+        # Число деревьев с наименьшей ошибкой на валидации (или out-of-bag);
+        # при дообучении без прежней истории она известна не для всех деревьев
+        self.best_iteration_ = None
+        if convergence_history is not None:
+            history = convergence_history["val"] or convergence_history["oob"]
+            if history and len(history) == self.n_estimators:
+                self.best_iteration_ = int(np.argmin(history)) + 1
         return convergence_history
 
+    @staticmethod
+    def _add_out_of_bag(
+            oob_sum: npt.NDArray[np.float64],
+            oob_count: npt.NDArray[np.int64],
+            tree_prediction: npt.NDArray[np.float64],
+            seed: np.random.SeedSequence,
+            y: npt.NDArray[np.float64]
+    ) -> float:
+        """
+        Add a tree's predictions on its out-of-bag objects in place.
+
+        Args:
+            oob_sum (npt.NDArray[np.float64]): Sums of out-of-bag
+                predictions, array of shape (n_objects,).
+            oob_count (npt.NDArray[np.int64]): Numbers of trees
+                summed for every object, array of shape (n_objects,).
+            tree_prediction (npt.NDArray[np.float64]): Predictions of
+                the tree on the training set, array of shape (n_objects,).
+            seed (np.random.SeedSequence): Tree's own seed sequence.
+            y (npt.NDArray[np.float64]): Regression labels,
+                array of shape (n_objects,).
+
+        Returns:
+            float: RMSLE of the out-of-bag predictions over the objects
+                that have been out of bag at least once.
+        """
+        oob = _out_of_bag_mask(seed, len(y))
+        oob_sum[oob] += tree_prediction[oob]
+        oob_count += oob
+
+        has_oob = oob_count > 0
+        return rmsle(
+            y=y[has_oob],
+            z=oob_sum[has_oob] / oob_count[has_oob]
+        )
+
+    def _fitted_prefix(self) -> CompiledForest | None:
+        """
+        Get the compiled trees fitted so far, if any.
+
+        Returns:
+            CompiledForest | None: Compiled fitted trees or None
+            if the forest has not been fitted yet.
+        """
+        if self._compiled is None and not (
+            self.forest and hasattr(self.forest[0], "tree_")
+        ):
+            return None
+        return self._compiled_forest()
+
+    def _set_trees(
+            self,
+            prefix: CompiledForest | None,
+            new_trees: list[TreeRegressor]
+    ) -> None:
+        """
+        Store newly fitted trees after the already fitted ones.
+
+        Args:
+            prefix (CompiledForest | None): Compiled trees fitted
+                before, None when fitting from scratch.
+            new_trees (list[TreeRegressor]): Newly fitted trees.
+        """
+        if prefix is None:
+            self.forest = new_trees
+            self._compiled = None
+            return
+
+        # У загруженных из упакованного формата моделей деревьев sklearn нет
+        self.forest = self.forest + new_trees if self.forest else []
+        self._compiled = prefix.concatenate(
+            CompiledForest.from_trees(new_trees, dtype=self.dtype)
+        )
+
+    def _compiled_forest(self) -> CompiledForest:
+        """
+        Get the compiled inference representation of the forest.
+
+        It is built lazily from the fitted trees. Models loaded
+        from the packed format carry only this representation.
+
+        Returns:
+            CompiledForest: Packed arrays of all the trees.
+        """
+        if self._compiled is None:
+            self._compiled = CompiledForest.from_trees(
+                self.forest,
+                dtype=self.dtype
+            )
+        return self._compiled
+
     def _predict_trees(
             self,
             X: npt.NDArray[np.float64],
@@ -155,15 +562,16 @@ class RandomForestMSE:
         Returns:
             Предсказания
         """
-        predictions = np.array([
-            tree.predict(X)
-            for tree in self.forest[:n_trees]
-        ])
-        return np.mean(a=predictions, axis=0)
+        predictions_sum = self._compiled_forest().predict(
+            X=X,
+            n_trees=n_trees
+        )
+        return predictions_sum / n_trees
 
     def predict(
             self,
-            X: npt.NDArray[np.float64]
+            X: npt.NDArray[np.float64],
+            n_trees: int | None = None
     ) -> npt.NDArray[np.float64]:
         """
         Make prediction with ensemble of trees.
@@ -174,17 +582,54 @@ class RandomForestMSE:
         Args:
             X (npt.NDArray[np.float64]): Objects' features matrix,
                 array of shape (n_objects, n_features).
+            n_trees (int | None, optional): Number of leading trees
+                to average, e.g. `best_iteration_` to serve a smaller
+                and faster forest. Defaults to None (all trees).
 
         Returns:
             npt.NDArray[np.float64]: Predicted values, array of
                 shape (n_objects,).
         """
-        # Получаем предсказания от всех деревьев и усредняем их
-        predictions = np.array([
-            tree.predict(X)
-            for tree in self.forest
-        ])
-        return np.mean(a=predictions, axis=0)
+        if n_trees is None:
+            n_trees = self.n_estimators
+        if not 1 <= n_trees <= self.n_estimators:
+            raise ValueError(
+                f"n_trees must be between 1 and {self.n_estimators}, "
+                f"got {n_trees}"
+            )
+
+        # Суммируем предсказания деревьев батчами и усредняем
+        return self._predict_trees(
+            X=X,
+            n_trees=n_trees
+        )
+
+    def staged_predict(
+            self,
+            X: npt.NDArray[np.float64],
+            every: int = 1
+    ) -> Iterator[npt.NDArray[np.float64]]:
+        """
+        Make predictions of the growing forest in one pass.
+
+        Every tree is applied to `X` once, so evaluating all the
+        prefixes costs as much as a single `predict`.
+
+        Args:
+            X (npt.NDArray[np.float64]): Objects' features matrix,
+                array of shape (n_objects, n_features).
+            every (int, optional): Yield after every `every` trees
+                and after the last one. Defaults to 1.
+
+        Yields:
+            npt.NDArray[np.float64]: Predictions of the first
+                trees, array of shape (n_objects,).
+        """
+        for n_trees, predictions_sum in self._compiled_forest().staged_predict(
+            X=X,
+            every=every
+        ):
+            yield predictions_sum / n_trees
 
     def dump(
             self,
@@ -193,6 +638,9 @@ class RandomForestMSE:
         """
         Save the trained model to the specified directory.
 
+        All the trees are written into a single packed file
+        that `load` maps into memory.
+
         Args:
             dirpath (str): Path to the directory where
             the model will be saved.
@@ -200,17 +648,20 @@ class RandomForestMSE:
         path = Path(dirpath)
         path.mkdir(parents=True)
 
-        params = {"n_estimators": self.n_estimators}
+        params = {
+            "n_estimators": self.n_estimators,
+            "tree_params": self.tree_params,
+            "random_state": self.random_state,
+            "bootstrap": self.bootstrap,
+            "oob_score": self.oob_score,
+            "dtype": self.dtype.name,
+            "seed_entropy": self.seed_entropy,
+            "best_iteration": self.best_iteration_,
+        }
         with (path / "params.json").open("w") as file:
             json.dump(params, file, indent=4)
 
-        trees_path = path / "trees"
-        trees_path.mkdir()
-        for i, tree in enumerate(self.forest):
-            joblib.dump(
-                value=tree,
-                filename=trees_path / f"tree_{i:04d}.joblib"
-            )
+        self._compiled_forest().save(path / FOREST_FILE)
 
     @classmethod
     def load(
@@ -220,6 +671,10 @@ class RandomForestMSE:
         """
         Load a trained model from the specified directory.
 
+        Models in the packed format are memory-mapped and keep
+        only the compiled representation. Directories written
+        in the legacy per-tree joblib layout are still readable.
+
         Args:
             dirpath (str): Path to the directory
             where the model is saved.
@@ -229,7 +684,22 @@ class RandomForestMSE:
         """
         with (Path(dirpath) / "params.json").open() as file:
             params = json.load(file)
-        instance = cls(params["n_estimators"])
+        instance = cls(
+            params["n_estimators"],
+            tree_params=params.get("tree_params"),
+            random_state=params.get("random_state"),
+            bootstrap=params.get("bootstrap", "indices"),
+            oob_score=params.get("oob_score", False),
+            dtype=params.get("dtype", "float64"),
+        )
+        instance.seed_entropy = params.get("seed_entropy")
+        instance.best_iteration_ = params.get("best_iteration")
+
+        forest_path = Path(dirpath) / FOREST_FILE
+        if forest_path.exists():
+            instance.forest = []
+            instance._compiled = CompiledForest.load(forest_path)
+            return instance
 
         trees_path = Path(dirpath) / "trees"
 
@@ -240,4 +710,4 @@ class RandomForestMSE:
             for i in range(params["n_estimators"])
         ]
 
-        return instance
\ No newline at end of file
+        return instance
@@ -1,4 +1,4 @@
-from typing import TypedDict
+from typing import Callable, TypedDict
 
 import numpy as np
 import numpy.typing as npt
@@ -14,10 +14,46 @@ class ConvergenceHistory(TypedDict):
         A list of training losses over epochs.
     val : list[float] | None, optional
         A list of validation losses over epochs. Defaults to None.
+    oob : list[float] | None, optional
+        A list of out-of-bag losses over epochs. Defaults to None.
     """
 
     train: list[float]
     val: list[float] | None = None
+    oob: list[float] | None = None
+
+
+class TrainingProgress(TypedDict):
+    """
+    TypedDict passed to the progress callback after every fitted tree.
+
+    Attributes
+    ----------
+    iteration : int
+        Number of trees fitted so far.
+    n_estimators : int
+        Total number of trees to fit.
+    train : float | None
+        Training loss of the current ensemble, None if not traced.
+    val : float | None
+        Validation loss of the current ensemble, None if not traced
+        or no validation data is provided.
+    oob : float | None
+        Out-of-bag loss of the current ensemble, None if it is
+        not estimated.
+    elapsed : float
+        Seconds passed since the start of fitting.
+    """
+
+    iteration: int
+    n_estimators: int
+    train: float | None
+    val: float | None
+    oob: float | None
+    elapsed: float
+
+
+ProgressCallback = Callable[[TrainingProgress], None]
 
 
 def rmsle(
@@ -60,7 +96,8 @@ def whether_to_stop(
     Determine whether to stop training basedon the convergence history.
 
     This function checks if the training or validation loss has not improved for a specified number of epochs (patience).
-    If the validation loss history is provided, it is used for the decision; otherwise, the training loss history is used.
+    If the validation loss history is provided, it is used for the decision; otherwise, the out-of-bag loss history
+    is used if present, and the training loss history if not.
 
     Args
     ----
@@ -81,9 +118,12 @@ def whether_to_stop(
     KeyError
         If neither 'train' nor 'val' key is present in the convergence_history.
     """
-    # Выбираем историю для анализа: валидационную, если есть, иначе тренировочную
+    # Выбираем историю для анализа: валидационную, если есть, затем
+    # out-of-bag, иначе тренировочную
     if convergence_history["val"] is not None:
         history = convergence_history["val"]
+    elif convergence_history.get("oob") is not None:
+        history = convergence_history["oob"]
     else:
         history = convergence_history["train"]
 
@@ -95,4 +135,31 @@ def whether_to_stop(
     best_loss = min(history[-(patience + 1):])
 
     # Если лучший loss не на последнем шаге, значит не было улучшения за patience шагов
-    return best_loss < history[-1]
\ No newline at end of file
+    return best_loss < history[-1]
+
+
+def check_dtype(
+        dtype: npt.DTypeLike
+) -> np.dtype:
+    """
+    Validate the floating type of an ensemble.
+
+    Args
+    ----
+    dtype : npt.DTypeLike
+        Requested type of targets, predictions and leaf values.
+
+    Returns
+    -------
+    np.dtype
+        float64 or float32 type.
+
+    Raises
+    ------
+    ValueError
+        If the type is neither float64 nor float32.
+    """
+    dtype = np.dtype(dtype)
+    if dtype not in (np.float64, np.float32):
+        raise ValueError(f"dtype must be float64 or float32, got {dtype}")
+    return dtype
@@ -5,12 +5,19 @@ import streamlit as st
 from dotenv import load_dotenv
 
 from ensembles.backend import ExperimentConfig
-from ensembles.frontend import Client, plot_learning_curves
+from ensembles.frontend import (
+    Client,
+    ConvergenceHistoryResponse,
+    plot_learning_curves,
+)
 
 load_dotenv()
 BASE_URL = os.environ["BASE_URL"]
 MODEL_OPTIONS = ["Random Forest", "Gradient Boosting"]
 MAX_FEATURES_OPTIONS = ["all", "sqrt", "log2", "custom integer", "custom float"]
+TREE_METHOD_OPTIONS = ["exact", "hist"]
+VALIDATION_OPTIONS = ["holdout", "oob"]
+DTYPE_OPTIONS = ["float64", "float32"]
 
 
 @st.cache_data
@@ -49,6 +56,33 @@ if experiment_option == "start new":
             max_features = st.number_input(
                 "Enter custom value", min_value=1, format="%d"
             )
+        tree_method = st.selectbox("Tree method", options=TREE_METHOD_OPTIONS)
+        max_bins = 255
+        if tree_method == "hist":
+            max_bins = st.number_input("Max bins", min_value=2, max_value=255, value=255)
+        # float32 halves the memory of predictions and stored leaf values
+        dtype = st.selectbox("Precision", options=DTYPE_OPTIONS)
+        validation = "holdout"
+        if model_choice == "Random Forest":
+            # Out-of-bag validation trains on all rows instead of 80%
+            validation = st.selectbox("Validation", options=VALIDATION_OPTIONS)
+        subsample, goss_top_rate, colsample_bytree = 1.0, None, 1.0
+        if model_choice == "Gradient Boosting":
+            # Every tree is fit on a random part of the rows and columns
+            subsample = st.number_input(
+                "Subsample", min_value=0.05, max_value=1.0, value=1.0, format="%.2f"
+            )
+            if subsample < 1 and st.checkbox("Gradient-based one-side sampling"):
+                goss_top_rate = st.number_input(
+                    "Top residuals rate",
+                    min_value=0.01,
+                    max_value=max(0.01, subsample - 0.01),
+                    value=min(0.2, subsample / 2),
+                    format="%.2f",
+                )
+            colsample_bytree = st.number_input(
+                "Column sample by tree", min_value=0.01, max_value=1.0, value=1.0, format="%.2f"
+            )
 
         st.header("Upload Training Data")
         train_file = st.file_uploader("Upload your training CSV file", type=["csv"])
@@ -76,6 +110,13 @@ if experiment_option == "start new":
                     max_depth=max_depth,
                     max_features=max_features,
                     target_column=target_column,
+                    tree_method=tree_method,
+                    max_bins=max_bins,
+                    validation=validation,
+                    subsample=subsample,
+                    goss_top_rate=goss_top_rate,
+                    colsample_bytree=colsample_bytree,
+                    dtype=dtype,
                 )
                 client.register_experiment(experiment_config, train_file)
                 st.sidebar.success(
@@ -105,6 +146,34 @@ with st.sidebar:
         "Max depth", min_value=1, value=experiment_config.max_depth, disabled=True
     )
     st.text_input("Max features", value=experiment_config.max_features, disabled=True)
+    st.selectbox(
+        "Tree method",
+        options=TREE_METHOD_OPTIONS,
+        index=TREE_METHOD_OPTIONS.index(experiment_config.tree_method),
+        disabled=True,
+    )
+    st.selectbox(
+        "Validation",
+        options=VALIDATION_OPTIONS,
+        index=VALIDATION_OPTIONS.index(experiment_config.validation),
+        disabled=True,
+    )
+    st.selectbox(
+        "Precision",
+        options=DTYPE_OPTIONS,
+        index=DTYPE_OPTIONS.index(experiment_config.dtype),
+        disabled=True,
+    )
+    if experiment_config.ml_model == "Gradient Boosting":
+        st.number_input(
+            "Subsample", value=experiment_config.subsample, format="%.2f", disabled=True
+        )
+        st.number_input(
+            "Column sample by tree",
+            value=experiment_config.colsample_bytree,
+            format="%.2f",
+            disabled=True,
+        )
 
 # Training
 response = client.session.get(
@@ -117,8 +186,31 @@ if response.json()["response"]:
         "The model wasn't trained for the selected experiment yet. Train it to see learning curves and infer on your data."
     )
     if st.button("Train Model"):
-        with st.spinner("Training model..."):
-            client.train_model(experiment_config.name)
+        client.start_training(experiment_config.name)
+        progress_bar = st.progress(0.0, text="Training model...")
+        live_chart = st.empty()
+        history = {"train": [], "val": [], "oob": []}
+        for record in client.stream_train_progress(experiment_config.name):
+            if record.get("status") == "failed":
+                st.error(f"Training failed: {record['error']}")
+                st.stop()
+            if "iteration" not in record:
+                break
+            history["train"].append(record["train"])
+            history["val"].append(record["val"])
+            history["oob"].append(record.get("oob"))
+            progress_bar.progress(
+                record["iteration"] / record["n_estimators"],
+                text=f"Tree {record['iteration']}/{record['n_estimators']}, "
+                f"{record['elapsed']:.1f} s",
+            )
+            # Redraw the chart at most 50 times per training run
+            if record["iteration"] % max(1, record["n_estimators"] // 50) == 0:
+                live_chart.plotly_chart(plot_learning_curves(
+                    ConvergenceHistoryResponse(**history)
+                ))
+        progress_bar.empty()
+        live_chart.empty()
     else:
         st.stop()
 